@@ -21,10 +21,15 @@ from .config.static import *
 ###############################################################################
 
 
+# Caches are created by other modules when they are imported
+from . import cache
+
 from .core import *
 from .interpolate import is_voiced, is_vowel
 from .model import Model
+from .session import AlignerSession
 from . import baselines
+from . import benchmark
 from . import checkpoint
 from . import convert
 from . import data
@@ -35,7 +40,10 @@ from . import load
 from . import loudness
 from . import model
 from . import partition
+from . import pipeline
 from . import plot
+from . import registry
+from . import session
 from . import train
 from . import viterbi
 from . import write
@@ -46,6 +46,16 @@ def parse_args():
         '--gpu',
         type=int,
         help='The index of the GPU to use for inference. Defaults to CPU.')
+    parser.add_argument(
+        '--batch_size',
+        type=int,
+        default=pyfoal.INFERENCE_BATCH_SIZE,
+        help='The maximum number of files per batch for neural methods')
+    parser.add_argument(
+        '--memory_budget',
+        type=int,
+        default=pyfoal.INFERENCE_MEMORY_BUDGET,
+        help='The maximum bytes of network output per batch for neural models')
     return parser.parse_args()
 
 
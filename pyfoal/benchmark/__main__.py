@@ -0,0 +1,60 @@
+import argparse
+from pathlib import Path
+
+import pyfoal
+
+
+###############################################################################
+# Entry point
+###############################################################################
+
+
+def parse_args():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description='Run microbenchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    # Model forward pass
+    forward = subparsers.add_parser(
+        'forward',
+        help='Benchmark Model.forward with and without cached mel features')
+    forward.add_argument(
+        '--frames',
+        type=int,
+        default=1000,
+        help='The number of frames of input audio')
+    forward.add_argument(
+        '--phonemes',
+        type=int,
+        default=100,
+        help='The number of input phonemes')
+    forward.add_argument(
+        '--iterations',
+        type=int,
+        default=20,
+        help='The number of timed iterations per condition')
+    forward.add_argument(
+        '--gpu',
+        type=int,
+        help='The index of the GPU to use for benchmarking')
+
+    # Grapheme-to-phoneme
+    g2p = subparsers.add_parser(
+        'g2p',
+        help='Benchmark grapheme-to-phoneme words per second')
+    g2p.add_argument(
+        '--text_files',
+        type=Path,
+        nargs='+',
+        help='The transcripts to convert. Defaults to arctic.')
+    g2p.add_argument(
+        '--backends',
+        default=['g2p_en', 'lexicon'],
+        nargs='+',
+        help='The G2P backends to benchmark')
+
+    return parser.parse_known_args()[0]
+
+
+args = vars(parse_args())
+print(getattr(pyfoal.benchmark, args.pop('benchmark'))(**args))
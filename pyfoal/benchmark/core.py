@@ -0,0 +1,115 @@
+import time
+
+import torch
+
+import pyfoal
+
+
+###############################################################################
+# Microbenchmarks
+###############################################################################
+
+
+def forward(
+    frames=1000,
+    phonemes=100,
+    iterations=20,
+    gpu=None):
+    """Benchmark Model.forward with and without cached mel features
+
+    Arguments
+        frames : int
+            The number of frames of input audio
+        phonemes : int
+            The number of input phonemes
+        iterations : int
+            The number of timed forward passes per condition
+        gpu : int or None
+            The index of the GPU to benchmark on
+
+    Returns
+        results : dict
+            Mean seconds per forward pass for each condition
+    """
+    device = torch.device('cpu' if gpu is None else f'cuda:{gpu}')
+
+    # Random inputs
+    model = pyfoal.Model().to(device).eval()
+    audio = torch.randn(
+        (1, 1, frames * pyfoal.HOPSIZE),
+        device=device)
+    indices = torch.randint(
+        len(pyfoal.load.phonemes()),
+        (1, 1, phonemes),
+        device=device)
+
+    def run(cached):
+        # Warmup
+        with torch.inference_mode():
+            model(indices, audio)
+
+        # Time
+        elapsed = 0.
+        for _ in range(iterations):
+
+            # Maybe discard filterbank and window to force recomputation
+            if not cached:
+                pyfoal.data.preprocess.mels.reset_cache()
+
+            synchronize(device)
+            start = time.perf_counter()
+            with torch.inference_mode():
+                model(indices, audio)
+            synchronize(device)
+            elapsed += time.perf_counter() - start
+
+        return elapsed / iterations
+
+    # Time both conditions
+    uncached, cached = run(False), run(True)
+    return {
+        'cached': cached,
+        'uncached': uncached,
+        'saving': uncached - cached,
+        'cache': pyfoal.data.preprocess.mels.cache_stats()}
+
+
+def g2p(text_files=None, backends=('g2p_en', 'lexicon')):
+    """Benchmark G2P throughput of each backend, including startup
+
+    Arguments
+        text_files : list[Path] or None
+            The transcripts to convert. Defaults to the arctic dataset.
+        backends : list[str]
+            The G2P engine backends to benchmark
+
+    Returns
+        results : dict
+            Words per second of each method
+    """
+    if text_files is None:
+        text_files = sorted((pyfoal.CACHE_DIR / 'arctic').rglob('*.txt'))
+    texts = [pyfoal.load.text(file) for file in text_files]
+    words = sum(len(text.split()) for text in texts)
+
+    # Convert one text at a time, as during alignment
+    results = {}
+    for backend in backends:
+        start = time.perf_counter()
+        engine = pyfoal.g2p.Engine(backend)
+        for text in texts:
+            engine.from_texts([text])
+        results[backend] = words / (time.perf_counter() - start)
+
+    return results
+
+
+###############################################################################
+# Utilities
+###############################################################################
+
+
+def synchronize(device):
+    """Wait for pending device work to finish"""
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
@@ -0,0 +1,129 @@
+import collections
+import threading
+
+import torch
+
+
+###############################################################################
+# Least-recently-used cache
+###############################################################################
+
+
+class LRU:
+    """Thread-safe least-recently-used cache
+
+    Arguments
+        max_entries : int or None
+            Maximum number of cached values. Unbounded if None.
+        max_bytes : int or None
+            Maximum total size of cached values. Unbounded if None.
+        size : Callable[[object], int]
+            Computes the size of a value in bytes
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, size=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = nbytes if size is None else size
+        self.lock = threading.Lock()
+        self.reset()
+
+    def __call__(self):
+        """Retrieve cache statistics"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'bytes': self.bytes,
+                'entries': len(self.entries),
+                'evictions': self.evictions,
+                'hit-rate': self.hits / lookups if lookups else 0.,
+                'hits': self.hits,
+                'misses': self.misses}
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def get(self, key, create):
+        """Retrieve a value, creating and caching it if it is not cached
+
+        Arguments
+            key : Hashable
+                The cache key
+            create : Callable[[], object]
+                Creates the value on a cache miss
+
+        Returns
+            value : object
+                The cached or created value
+        """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            self.misses += 1
+
+        # Create without holding the lock so other keys can be retrieved
+        value = create()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Cache a value, evicting least-recently-used values to fit"""
+        size = self.size(value)
+
+        # Don't cache values that can never fit
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        with self.lock:
+
+            # Replace existing value
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+
+            # Insert
+            self.entries[key] = (value, size)
+            self.bytes += size
+
+            # Evict
+            while (
+                (
+                    self.max_entries is not None and
+                    len(self.entries) > self.max_entries
+                ) or
+                (self.max_bytes is not None and self.bytes > self.max_bytes)
+            ):
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def reset(self):
+        """Remove all values and reset statistics"""
+        with self.lock:
+            self.entries = collections.OrderedDict()
+            self.bytes = 0
+            self.evictions = 0
+            self.hits = 0
+            self.misses = 0
+
+
+###############################################################################
+# Utilities
+###############################################################################
+
+
+def nbytes(value):
+    """Get the size of a tensor or collection of tensors in bytes"""
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(nbytes(item) for item in value.values())
+    return 0
@@ -61,9 +61,27 @@ ALLOW_LOUD_SILENCE = True
 # Whether to allow spaces to be skipped
 ALLOW_SKIP_SPACE = True
 
+# Initial number of states per frame tracked by the banded decoder. The band
+# is widened automatically if the best path reaches its edge.
+BAND_WIDTH = 128  # phonemes
+
+# Viterbi decoding method. One of
+# ['banded', 'checkpointed', 'reference', 'vectorized'].
+DECODER = 'vectorized'
+
+# Maximum size of the lattice of backpointers stored by the vectorized
+# decoder. Larger inputs are decoded by storing periodic checkpoints of the
+# forward pass and recomputing each segment during the backward pass.
+DECODER_MEMORY_BUDGET = 2 ** 30  # bytes
+
 # Whether to perform local interpolation over time
 INTERPOLATE = False
 
+# Maximum difference in log-probability between the best state and any state
+# kept by the online decoder. Pruning lets surviving paths converge so that
+# phonemes are emitted before the end of the input.
+ONLINE_BEAM = 20.
+
 # Threshold below which audio is considered silent
 SILENCE_THRESHOLD = -60.  # dB
 
@@ -113,6 +131,52 @@ LOG_STEPS = 16
 PLOT_EXAMPLES = 8
 
 
+###############################################################################
+# Grapheme-to-phoneme parameters
+###############################################################################
+
+
+# G2P backend. One of ['g2p_en', 'lexicon']. The lexicon backend looks up
+# words in a compact CMUdict lexicon and only runs the neural model on
+# out-of-vocabulary words.
+G2P_BACKEND = 'lexicon'
+
+# Maximum number of word pronunciations cached by the G2P engine
+G2P_CACHE_SIZE = 2 ** 16
+
+
+###############################################################################
+# Inference parameters
+###############################################################################
+
+
+# Maximum number of files per batch when aligning many files
+INFERENCE_BATCH_SIZE = 64
+
+# Number of threads loading files and running G2P when aligning many files
+INFERENCE_LOAD_THREADS = 4
+
+# Maximum size of network output computed at once. Files are batched up to
+# this size. Longer inputs are aligned by computing attention and decoding in
+# chunks of frames.
+INFERENCE_MEMORY_BUDGET = 2 ** 30  # bytes
+
+# Maximum number of models kept loaded for inference. Models are keyed by
+# checkpoint, configuration, and device.
+MODEL_CACHE_ENTRIES = 4
+
+# Maximum size of parameters and buffers of models kept loaded for inference.
+# Unbounded if None.
+MODEL_CACHE_SIZE = None  # bytes
+
+# Data type of attention priors cached during inference. Reduced precision
+# fits more priors in the cache.
+PRIOR_CACHE_DTYPE = 'float32'
+
+# Maximum size of attention priors cached during inference
+PRIOR_CACHE_SIZE = 2 ** 28  # bytes
+
+
 ###############################################################################
 # Training parameters
 ###############################################################################
@@ -1,5 +1,5 @@
 import contextlib
-import functools
+import math
 import os
 
 import pypar
@@ -58,18 +58,10 @@ def from_text_and_audio(
 
     # RADTTS neural alignment
     if aligner == 'radtts':
-
-        # Get inference device
-        device = torch.device('cpu' if gpu is None else f'cuda:{gpu}')
-
-        # Preprocess
-        phonemes, audio = preprocess(text, audio, sample_rate)
-
-        # Infer
-        logits = infer(phonemes.to(device), audio.to(device), checkpoint)
-
-        # Postprocess
-        return postprocess(phonemes[0], logits[0], audio[0])
+        return pyfoal.session.default(checkpoint, gpu).from_text_and_audio(
+            text,
+            audio,
+            sample_rate)
 
     raise ValueError(f'Aligner {aligner} is not defined')
 
@@ -184,7 +176,9 @@ def from_files_to_files(
     aligner=pyfoal.ALIGNER,
     num_workers=None,
     checkpoint=pyfoal.DEFAULT_CHECKPOINT,
-    gpu=None):
+    gpu=None,
+    batch_size=pyfoal.INFERENCE_BATCH_SIZE,
+    memory_budget=pyfoal.INFERENCE_MEMORY_BUDGET):
     """Perform parallel phoneme alignment from many files and save to disk
 
     Arguments
@@ -202,6 +196,11 @@ def from_files_to_files(
             The checkpoint to use for neural methods
         gpu : int
             The index of the gpu to perform alignment on for neural methods
+        batch_size : int
+            The maximum number of files per batch for neural methods
+        memory_budget : int
+            The maximum size in bytes of the network output of a batch for
+            neural methods
     """
     # Montreal forced aligner
     if aligner == 'mfa':
@@ -221,12 +220,15 @@ def from_files_to_files(
 
     # RAD-TTS neural alignment
     elif aligner == 'radtts':
-        align_fn = functools.partial(
-            from_file_to_file,
-            checkpoint=checkpoint,
-            gpu=gpu)
-        for item in zip(text_files, audio_files, output_files):
-            align_fn(*item)
+        pyfoal.pipeline.from_files_to_files(
+            text_files,
+            audio_files,
+            output_files,
+            checkpoint,
+            gpu,
+            batch_size,
+            memory_budget,
+            num_workers)
 
     else:
         raise ValueError(f'Aligner {aligner} is not defined')
@@ -237,78 +239,208 @@ def from_files_to_files(
 ###############################################################################
 
 
-def infer(phonemes, audio, checkpoint=pyfoal.DEFAULT_CHECKPOINT):
-    """Perform forward pass to retrieve attention alignment"""
-    # Maybe cache model
-    if (
-        not hasattr(infer, 'model') or
-        infer.checkpoint != checkpoint or
-        infer.device != phonemes.device
-    ):
-        # Maybe initialize model
-        model = pyfoal.Model()
-
-        # Load from disk
-        infer.model, *_ = pyfoal.checkpoint.load(checkpoint, model)
-        infer.checkpoint = checkpoint
-        infer.device = phonemes.device
+def infer(
+    phonemes,
+    audio,
+    checkpoint=pyfoal.DEFAULT_CHECKPOINT,
+    return_spectrogram=False,
+    model=None):
+    """Perform forward pass to retrieve attention alignment
 
-        # Move model to correct device
-        infer.model = infer.model.to(infer.device)
+    If return_spectrogram is True, also returns the magnitude spectrogram
+    computed alongside the mels, which postprocess can reuse for loudness.
+    The checkpoint is loaded unless a model is given.
+    """
+    if model is None:
+        model = load_model(checkpoint, phonemes.device)
 
-    with inference_context(infer.model):
+    with inference_context(model):
 
         # Get prior distribution
-        prior = pyfoal.data.preprocess.prior.from_lengths(
+        prior = pyfoal.data.preprocess.prior.from_lengths_cached(
             phonemes.shape[-1],
-            pyfoal.convert.samples_to_frames(audio.shape[-1])).to(infer.device)
+            pyfoal.convert.samples_to_frames(audio.shape[-1]),
+            phonemes.device)
+
+        # Compute melspectrogram
+        mels, spectrogram = pyfoal.data.preprocess.mels.from_audio(
+            audio,
+            return_spectrogram=True)
+
+        # Infer
+        logits = model(phonemes, prior=prior, mels=mels)
+
+    # Maybe return magnitude spectrogram
+    if return_spectrogram:
+        return logits, spectrogram
+    return logits
+
+
+def infer_batch(
+    phonemes,
+    audio,
+    phoneme_lengths,
+    frame_lengths,
+    checkpoint=pyfoal.DEFAULT_CHECKPOINT,
+    model=None):
+    """Perform masked forward pass on a padded batch
+
+    The checkpoint is loaded unless a model is given.
+    """
+    if model is None:
+        model = load_model(checkpoint, phonemes.device)
+    frames = pyfoal.convert.samples_to_frames(audio.shape[-1])
+
+    with inference_context(model):
+
+        # Get padded prior distributions and sequence mask
+        prior = torch.zeros(
+            (len(phonemes), frames, phonemes.shape[-1]),
+            device=phonemes.device)
+        mask = torch.zeros_like(prior, dtype=torch.bool)
+        for i, (phoneme_length, frame_length) in enumerate(
+            zip(phoneme_lengths.tolist(), frame_lengths.tolist())
+        ):
+            prior[i, :frame_length, :phoneme_length] = \
+                pyfoal.data.preprocess.prior.from_lengths_cached(
+                    phoneme_length,
+                    frame_length,
+                    phonemes.device)
+            mask[i, :frame_length, :phoneme_length] = True
 
         # Infer
-        return infer.model(phonemes, audio, prior)
+        return model(phonemes, audio, prior, mask)
+
+
+def infer_chunked(
+    phonemes,
+    audio,
+    checkpoint=pyfoal.DEFAULT_CHECKPOINT,
+    model=None,
+    memory_budget=pyfoal.INFERENCE_MEMORY_BUDGET):
+    """Perform forward pass and decoding in chunks of frames
+
+    Mels and phonemes are encoded once. Attention and the prior are then
+    computed for a chunk of frames at a time as the decoder requests them,
+    so the full frames x phonemes attention is never materialized. Chunks
+    fit within memory_budget bytes. The checkpoint is loaded unless a model
+    is given.
+    """
+    if model is None:
+        model = load_model(checkpoint, phonemes.device)
+    frames = pyfoal.convert.samples_to_frames(audio.shape[-1])
 
+    with inference_context(model):
+
+        # Compute melspectrogram
+        mels, spectrogram = pyfoal.data.preprocess.mels.from_audio(
+            audio,
+            return_spectrogram=True)
 
-def postprocess(phonemes, logits, audio):
-    """Postprocess logits to produce alignment"""
+        # Maybe extract loudness to detect silences
+        if pyfoal.ALLOW_LOUD_SILENCE:
+            loudness = None
+        else:
+            loudness = pyfoal.loudness.from_spectrogram(spectrogram).cpu()
+
+        # Encode mels and phonemes
+        query, key = model.encode(phonemes, mels=mels)
+
+        # Compute attention for a chunk of frames
+        def logits(start, end):
+            prior = pyfoal.data.preprocess.prior.from_lengths(
+                phonemes.shape[-1],
+                frames,
+                start,
+                end,
+                phonemes.device)
+            return model.attend(
+                query[..., start:end],
+                key,
+                prior[None])[0]
+
+        # Decode
+        indices, counts = pyfoal.viterbi.decode_chunked(
+            phonemes[0],
+            logits,
+            frames,
+            chunk_size(phonemes.shape[-1], memory_budget),
+            loudness)
+
+    # Convert to alignment
+    return counts_to_alignment(phonemes[0], indices, counts)
+
+
+def postprocess(
+    phonemes,
+    logits,
+    audio,
+    return_confidence=False,
+    spectrogram=None):
+    """Postprocess logits to produce alignment
+
+    If return_confidence is True, also returns the mean forward-backward
+    posterior of each phoneme in the alignment, which is computed during
+    decoding without an additional model pass. If the magnitude spectrogram
+    returned by infer is given, loudness is computed from it on its device
+    instead of from audio.
+    """
     # Maybe extract loudness to detect silences
     if pyfoal.ALLOW_LOUD_SILENCE:
         loudness = None
+    elif spectrogram is not None:
+        loudness = pyfoal.loudness.from_spectrogram(spectrogram).cpu()
     else:
-        loudness = pyfoal.loudness.from_audio(audio.cpu())
+        loudness = pyfoal.loudness.from_audio(audio).cpu()
 
     # Get per-phoneme frame counts from network output
-    indices, counts = pyfoal.viterbi.decode(phonemes, logits, loudness)
+    indices, counts, *confidence = pyfoal.viterbi.decode(
+        phonemes,
+        logits,
+        loudness,
+        return_confidence=return_confidence)
 
-    # Account for padding applied to mels
-    if pyfoal.ADJUST_PADDING:
-        pad_count = pyfoal.convert.samples_to_frames(
-            (pyfoal.WINDOW_SIZE - pyfoal.HOPSIZE) // 2)
-        counts[0] -= pad_count
-        counts[-1] -= pad_count
+    # Convert to alignment
+    alignment = counts_to_alignment(phonemes, indices, counts)
 
-    # Convert phoneme indices to phonemes
-    phonemes = pyfoal.convert.indices_to_phonemes(
-        phonemes[0, indices.to(torch.long)])
+    # Maybe add per-phoneme confidence
+    if return_confidence:
+        return alignment, confidence[0]
+    return alignment
 
-    # Get phoneme durations in seconds
-    times = torch.cumsum(
-        torch.cat(
-            (torch.zeros(1, dtype=counts.dtype, device=counts.device),
-            counts)),
-        dim=0)
-    times = pyfoal.convert.frames_to_seconds(times)
 
-    # Match phonemes and start/end times
-    alignment = [
-        pypar.Word(phoneme, [pypar.Phoneme(phoneme, start, end)])
-        for phoneme, start, end in zip(phonemes, times[:-1], times[1:])]
+def postprocess_batch(
+    phonemes,
+    logits,
+    audio,
+    phoneme_lengths,
+    frame_lengths):
+    """Postprocess a padded batch of logits to produce alignments"""
+    # Maybe extract loudness to detect silences
+    if pyfoal.ALLOW_LOUD_SILENCE:
+        loudness = None
+    else:
+        loudness = pyfoal.loudness.from_audio(audio).cpu()
 
-    return pypar.Alignment(alignment)
+    # Get per-phoneme frame counts from network output
+    indices, counts = pyfoal.viterbi.decode_batch(
+        phonemes,
+        logits,
+        phoneme_lengths,
+        frame_lengths,
+        loudness)
+
+    # Convert to alignments
+    return [
+        counts_to_alignment(phoneme, index, count)
+        for phoneme, index, count in zip(phonemes, indices, counts)]
 
 
 def preprocess(text, audio, sample_rate):
     """Preprocess text and audio for alignment"""
     # Convert text to IPA
-    phonemes = pyfoal.g2p.from_text(text)[1]
+    # Output shape: (1, 1, phonemes)
+    phonemes = pyfoal.g2p.from_text(text)[1][None, None]
 
     # Resample audio
     audio = resample(audio, sample_rate)
@@ -332,12 +464,64 @@ def chdir(directory):
         os.chdir(previous_directory)
 
 
+def audio_file_frames(file):
+    """Get the number of frames of an audio file without loading it"""
+    info = torchaudio.info(file)
+    samples = math.ceil(
+        info.num_frames * pyfoal.SAMPLE_RATE / info.sample_rate)
+    return pyfoal.convert.samples_to_frames(samples)
+
+
+def cells(memory_budget=pyfoal.INFERENCE_MEMORY_BUDGET):
+    """Get the number of frame and phoneme pairs that fit in memory budget"""
+    # Computing attention keeps about four float32 frames x phonemes tensors
+    # alive at once (e.g., the distances, the attention, and the prior and
+    # its log), or about 16 bytes per frame and phoneme pair
+    return max(1, memory_budget // 16)
+
+
+def chunk_size(phonemes, memory_budget=pyfoal.INFERENCE_MEMORY_BUDGET):
+    """Get the number of frames that can be inferred within memory budget"""
+    return max(1, cells(memory_budget) // phonemes)
+
+
+def counts_to_alignment(phonemes, indices, counts):
+    """Convert decoded phoneme indices and frame counts to an alignment"""
+    # Account for padding applied to mels
+    if pyfoal.ADJUST_PADDING:
+        pad_count = pyfoal.convert.samples_to_frames(
+            (pyfoal.WINDOW_SIZE - pyfoal.HOPSIZE) // 2)
+        counts[0] -= pad_count
+        counts[-1] -= pad_count
+
+    # Convert phoneme indices to phonemes
+    phonemes = pyfoal.convert.indices_to_phonemes(
+        phonemes[0, indices.to(torch.long)])
+
+    # Get phoneme durations in seconds
+    times = torch.cumsum(
+        torch.cat(
+            (torch.zeros(1, dtype=counts.dtype, device=counts.device),
+            counts)),
+        dim=0)
+    times = pyfoal.convert.frames_to_seconds(times)
+
+    # Match phonemes and start/end times
+    alignment = [
+        pypar.Word(phoneme, [pypar.Phoneme(phoneme, start, end)])
+        for phoneme, start, end in zip(phonemes, times[:-1], times[1:])]
+
+    return pypar.Alignment(alignment)
+
+
 @contextlib.contextmanager
 def inference_context(model):
     device_type = next(model.parameters()).device.type
 
     # Prepare model for evaluation
-    model.eval()
+    training = model.training
+    if training:
+        model.eval()
 
     # Turn off gradient computation
     with torch.no_grad():
@@ -350,8 +534,10 @@ def inference_context(model):
         else:
             yield
 
-    # Prepare model for training
-    model.train()
+    # Restore training mode. Models that are already in evaluation mode are
+    # not modified, so they can be shared between threads.
+    if training:
+        model.train()
 
 
 def iterator(iterable, message, initial=0, total=None):
@@ -364,10 +550,108 @@ def iterator(iterable, message, initial=0, total=None):
         total=len(iterable) if total is None else total)
 
 
+def load_model(checkpoint, device):
+    """Load a model for inference, reusing resident models if possible"""
+    return pyfoal.registry.get(checkpoint, device)
+
+
+def pad_batch(phonemes, audio):
+    """Pad variable-length phonemes and audio into a batch
+
+    Arguments
+        phonemes : list[torch.tensor(shape=(phonemes,))]
+            The phoneme indices of each item
+        audio : list[torch.tensor(shape=(1, samples))]
+            The speech signal of each item
+
+    Returns
+        phonemes : torch.tensor(shape=(batch, 1, max_phonemes))
+            The padded phoneme indices
+        audio : torch.tensor(shape=(batch, 1, max_samples))
+            The padded speech signal
+        phoneme_lengths : torch.tensor(shape=(batch,))
+            The number of phonemes of each item
+        frame_lengths : torch.tensor(shape=(batch,))
+            The number of frames of each item
+    """
+    # Get lengths
+    phoneme_lengths = torch.tensor(
+        [len(indices) for indices in phonemes],
+        dtype=torch.long)
+    audio_lengths = torch.tensor(
+        [item.shape[-1] for item in audio],
+        dtype=torch.long)
+    frame_lengths = pyfoal.convert.samples_to_frames(audio_lengths)
+
+    # Pad
+    padded_phonemes = torch.zeros(
+        (len(phonemes), 1, phoneme_lengths.max().item()),
+        dtype=torch.long)
+    padded_audio = torch.zeros((len(audio), 1, audio_lengths.max().item()))
+    for i, (indices, item) in enumerate(zip(phonemes, audio)):
+        padded_phonemes[i, 0, :len(indices)] = indices
+        padded_audio[i, :, :item.shape[-1]] = item
+
+    return padded_phonemes, padded_audio, phoneme_lengths, frame_lengths
+
+
 def resample(audio, sample_rate, target_rate=pyfoal.SAMPLE_RATE):
-    """Perform audio resampling"""
+    """Perform audio resampling along the last dimension"""
     if sample_rate == target_rate:
         return audio
-    resampler = torchaudio.transforms.Resample(sample_rate, target_rate)
-    resampler = resampler.to(audio.device)
-    return resampler(audio)
+    return resampler(
+        sample_rate,
+        target_rate,
+        audio.device,
+        audio.dtype)(audio)
+
+
+def resample_batch(audio, sample_rate, target_rate=pyfoal.SAMPLE_RATE):
+    """Resample variable-length clips with the same sample rate in one call
+
+    Arguments
+        audio : list[torch.tensor(shape=(channels, samples))]
+            The clips to resample
+        sample_rate : int
+            The sample rate of all clips
+        target_rate : int
+            The sample rate to resample to
+
+    Returns
+        audio : list[torch.tensor(shape=(channels, resampled_samples))]
+            The resampled clips
+    """
+    if sample_rate == target_rate or not audio:
+        return audio
+
+    # Pad with zeros, which the resampler also pads with
+    lengths = [clip.shape[-1] for clip in audio]
+    padded = audio[0].new_zeros(
+        (len(audio), *audio[0].shape[:-1], max(lengths)))
+    for i, clip in enumerate(audio):
+        padded[i, ..., :clip.shape[-1]] = clip
+
+    # Resample
+    padded = resample(padded, sample_rate, target_rate)
+
+    # Remove padding
+    return [
+        padded[i, ..., :math.ceil(length * target_rate / sample_rate)]
+        for i, length in enumerate(lengths)]
+
+
+def resampler(sample_rate, target_rate, device, dtype):
+    """Retrieve a cached resampler
+
+    Constructing a resampler computes its sinc interpolation kernel, so
+    resamplers are cached by sample rates, device, and data type.
+    """
+    return resampler.cache.get(
+        (sample_rate, target_rate, str(device), dtype),
+        lambda: torchaudio.transforms.Resample(
+            sample_rate,
+            target_rate).to(device=device, dtype=dtype))
+
+
+# Resamplers are cached by sample rates, device, and data type
+resampler.cache = pyfoal.cache.LRU(max_entries=16)
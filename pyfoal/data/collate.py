@@ -1,3 +1,5 @@
+import math
+
 import torch
 
 import pyfoal
@@ -9,9 +11,12 @@ import pyfoal
 
 
 def collate(batch):
-    """Batch collation"""
+    """Batch collation
+
+    Attention priors are computed from the phoneme and frame lengths.
+    """
     # Unpack
-    phonemes, audios, priors, alignments, text, stems = zip(*batch)
+    phonemes, audios, mels, alignments, text, stems = zip(*batch)
 
     # Get phoneme lengths
     phoneme_lengths = torch.tensor(
@@ -19,22 +24,42 @@ def collate(batch):
         dtype=torch.long)
     max_phoneme_length = phoneme_lengths.max().item()
 
-    # Get audio lengths
-    audio_lengths = torch.tensor(
-        [audio.shape[-1] for audio in audios],
-        dtype=torch.long)
-    max_audio_length = audio_lengths.max().item()
+    # Maybe get audio lengths
+    if audios[0] is not None:
+        audio_lengths = torch.tensor(
+            [audio.shape[-1] for audio in audios],
+            dtype=torch.long)
+        max_audio_length = audio_lengths.max().item()
+    else:
+        audio_lengths = [None] * len(audios)
 
     # Get frame lengths
-    frame_lengths = pyfoal.convert.samples_to_frames(audio_lengths)
-    max_frame_length = pyfoal.convert.samples_to_frames(max_audio_length)
+    if mels[0] is not None:
+        frame_lengths = torch.tensor(
+            [mel.shape[-1] for mel in mels],
+            dtype=torch.long)
+    else:
+        frame_lengths = pyfoal.convert.samples_to_frames(audio_lengths)
+    max_frame_length = frame_lengths.max().item()
 
     # Get padded tensors for training
     padded_phonemes = torch.zeros(
         (len(phonemes), 1, max_phoneme_length),
         dtype=torch.long)
-    padded_audio = torch.zeros((len(audios), 1, max_audio_length))
-    padded_priors = torch.zeros((len(priors), max_frame_length, max_phoneme_length))
+    padded_priors = torch.zeros(
+        (len(phonemes), max_frame_length, max_phoneme_length))
+    if audios[0] is not None:
+        padded_audio = torch.zeros((len(audios), 1, max_audio_length))
+    else:
+        padded_audio = None
+
+    # Pad mels with the log-mel floor of silence
+    if mels[0] is not None:
+        padded_mels = torch.full(
+            (len(mels), pyfoal.NUM_MELS, max_frame_length),
+            math.log(1e-5))
+    else:
+        padded_mels = None
 
     # Get sequence mask
     mask = torch.zeros(
@@ -46,23 +71,39 @@ def collate(batch):
         zip(
             phonemes,
             audios,
-            priors,
+            mels,
             phoneme_lengths,
             audio_lengths,
             frame_lengths))
     for (
         i,
-        (phoneme, audio, prior, phoneme_length, audio_length, frame_length)
+        (
+            phoneme,
+            audio,
+            mel,
+            phoneme_length,
+            audio_length,
+            frame_length
+        )
     ) in iterator:
 
         # Pad phonemes
         padded_phonemes[i, :, :phoneme_length] = phoneme
 
-        # Pad audio
-        padded_audio[i, :, :audio_length] = audio
+        # Maybe pad audio
+        if audio is not None:
+            padded_audio[i, :, :audio_length] = audio
+
+        # Maybe pad mels
+        if mel is not None:
+            padded_mels[i, :, :frame_length] = mel
 
-        # Pad prior
-        padded_priors[i, :frame_length, :phoneme_length] = prior
+        # Compute and pad prior
+        padded_priors[i, :frame_length, :phoneme_length] = \
+            pyfoal.data.preprocess.prior.from_lengths_cached(
+                phoneme_length.item(),
+                frame_length.item(),
+                dtype=padded_priors.dtype)
 
         # Create mask
         mask[i, :frame_length, :phoneme_length] = True
@@ -70,6 +111,7 @@ def collate(batch):
     return (
         padded_phonemes,
         padded_audio,
+        padded_mels,
         padded_priors,
         mask,
         phoneme_lengths,
@@ -14,8 +14,9 @@ import pyfoal
 class Dataset(torch.utils.data.Dataset):
     """PyTorch dataset"""
 
-    def __init__(self, datasets, partition):
+    def __init__(self, datasets, partition, audio=True):
         self.partition = partition
+        self.audio = audio
         self.datasets = [
             Metadata(dataset, partition) for dataset in datasets]
 
@@ -30,11 +31,14 @@ class Dataset(torch.utils.data.Dataset):
         # Load phoneme indices
         phonemes = torch.load(dataset.cache / f'{stem}-phonemes.pt')
 
-        # Load audio
-        audio = pyfoal.load.audio(dataset.cache / f'{stem}.wav')
+        # Maybe load precomputed mels
+        mels = dataset.mels(stem)
 
-        # Compute prior
-        prior = torch.load(dataset.cache / f'{stem}-prior.pt')
+        # Maybe load audio
+        if self.audio or mels is None:
+            audio = pyfoal.load.audio(dataset.cache / f'{stem}.wav')
+        else:
+            audio = None
 
         # Maybe load true alignment
         if dataset.name == 'arctic':
@@ -45,7 +49,7 @@ class Dataset(torch.utils.data.Dataset):
         # Load text
         text = pyfoal.load.text(dataset.cache / f'{stem}.txt')
 
-        return phonemes, audio, prior, alignment, text, stem
+        return phonemes, audio, mels, alignment, text, stem
 
     def __len__(self):
         """Length of the dataset"""
@@ -99,13 +103,40 @@ class Metadata:
         self.cache = pyfoal.CACHE_DIR / name
         self.stems = pyfoal.load.partition(name)[partition]
 
+        # Maybe load index of precomputed mels
+        self.index = pyfoal.load.mel_index(self.cache)
+        self.store = None
+
         # Store lengths for bucketing
-        audio_files = list([
-            self.cache / f'{stem}.wav' for stem in self.stems])
-        self.lengths = [
-            pyfoal.convert.samples_to_frames(
-                torchaudio.info(audio_file).num_frames)
-            for audio_file in audio_files]
+        if self.index is None:
+            audio_files = list([
+                self.cache / f'{stem}.wav' for stem in self.stems])
+            self.lengths = [
+                pyfoal.convert.samples_to_frames(
+                    torchaudio.info(audio_file).num_frames)
+                for audio_file in audio_files]
+        else:
+            self.lengths = [self.index[stem][1] for stem in self.stems]
 
     def __len__(self):
         return len(self.stems)
+
+    def mels(self, stem):
+        """Retrieve precomputed mels without copying, or None if absent"""
+        if self.index is None:
+            return None
+
+        # Map store into memory in each data loading worker. Copy-on-write
+        # makes slices writable from torch's perspective without writing to
+        # disk.
+        if self.store is None:
+            self.store = np.memmap(
+                self.cache / 'mels.dat',
+                dtype=np.float16,
+                mode='c')
+
+        # Slice store
+        offset, frames = self.index[stem]
+        return torch.from_numpy(
+            self.store[offset:offset + pyfoal.NUM_MELS * frames]
+        ).reshape(pyfoal.NUM_MELS, frames)
@@ -8,10 +8,14 @@ import pyfoal
 ###############################################################################
 
 
-def loader(dataset, partition=None, gpu=None):
-    """Retrieve a data loader"""
+def loader(dataset, partition=None, gpu=None, audio=True):
+    """Retrieve a data loader
+
+    If audio is False and mels were precomputed during preprocessing, audio
+    is not loaded and batches contain mels instead.
+    """
     # Get dataset
-    dataset = pyfoal.data.Dataset(dataset, partition)
+    dataset = pyfoal.data.Dataset(dataset, partition, audio)
 
     # Get sampler
     sampler = pyfoal.data.sampler(dataset, partition)
@@ -16,6 +16,10 @@ def parse_args():
         default=pyfoal.DATASETS,
         nargs='+',
         help='The names of the datasets to preprocess')
+    parser.add_argument(
+        '--mels',
+        action='store_true',
+        help='Save mels to a memory-mapped store for training')
     return parser.parse_args()
 
 
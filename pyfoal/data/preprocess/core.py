@@ -1,7 +1,3 @@
-import numpy as np
-import scipy
-import torch
-
 import pyfoal
 
 
@@ -10,34 +6,36 @@ import pyfoal
 ###############################################################################
 
 
-def datasets(datasets):
+def datasets(datasets, mels=False):
     """Preprocess a dataset
     Arguments
         name - string
             The name of the dataset to preprocess
+        mels - bool
+            Whether to save mels to a memory-mapped store for training
     """
-    for dataset in datasets:
-        directory = pyfoal.CACHE_DIR / dataset
-
-        # Get text files
-        text_files = list(directory.rglob('*.txt'))
-
-        # Get audio files
-        audio_files = [file.with_suffix('.wav') for file in text_files]
-
-        # Get output phoneme files
-        phoneme_files = [
-            file.parent / f'{file.stem}-phonemes.pt' for file in text_files]
-
-        # Grapheme-to-phoneme
-        pyfoal.g2p.from_files_to_files(text_files, phoneme_files)
-
-        # Get output prior files
-        prior_files = [
-            file.parent / f'{file.stem}-prior.pt' for file in text_files]
-
-        # Attention prior
-        pyfoal.data.preprocess.prior.from_files_to_files(
-            text_files,
-            audio_files,
-            prior_files)
+    directories = [pyfoal.CACHE_DIR / dataset for dataset in datasets]
+
+    # Get text files
+    text_files = [
+        file
+        for directory in directories
+        for file in sorted(directory.rglob('*.txt'))]
+
+    # Get audio files
+    audio_files = [file.with_suffix('.wav') for file in text_files]
+
+    # Get output phoneme files
+    phoneme_files = [
+        file.parent / f'{file.stem}-phonemes.pt' for file in text_files]
+
+    # Grapheme-to-phoneme once per unique transcript of all datasets. Attention
+    # priors are computed from lengths during training.
+    pyfoal.g2p.from_files_to_files(text_files, phoneme_files)
+
+    # Maybe save mels
+    if mels:
+        for directory in directories:
+            pyfoal.data.preprocess.mels.from_files_to_store(
+                directory,
+                [file for file in audio_files if directory in file.parents])
@@ -1,5 +1,9 @@
+import json
+
 import librosa
+import numpy as np
 import torch
+import torchaudio
 
 import pyfoal
 
@@ -9,21 +13,12 @@ import pyfoal
 ###############################################################################
 
 
-def from_audio(audio):
-    """Compute spectrogram from audio"""
-    # Cache hann window
-    if (
-        not hasattr(from_audio, 'window') or
-        from_audio.dtype != audio.dtype or
-        from_audio.device != audio.device
-    ):
-        from_audio.window = torch.hann_window(
-            pyfoal.WINDOW_SIZE,
-            dtype=audio.dtype,
-            device=audio.device)
-        from_audio.dtype = audio.dtype
-        from_audio.device = audio.device
+def from_audio(audio, return_spectrogram=False):
+    """Compute spectrogram from audio
 
+    If return_spectrogram is True, also returns the magnitude spectrogram,
+    which can be reused to compute loudness without another stft.
+    """
     # Pad audio
     size = (pyfoal.NUM_FFT - pyfoal.HOPSIZE) // 2
     audio = torch.nn.functional.pad(
@@ -36,7 +31,7 @@ def from_audio(audio):
         audio.squeeze(1),
         pyfoal.NUM_FFT,
         hop_length=pyfoal.HOPSIZE,
-        window=from_audio.window,
+        window=window(audio.device, audio.dtype),
         center=False,
         normalized=False,
         onesided=True,
@@ -44,30 +39,110 @@ def from_audio(audio):
     stft = torch.view_as_real(stft)
 
     # Compute magnitude
-    spectrogram = torch.sqrt(stft.pow(2).sum(-1) + 1e-6)
+    power = stft.pow(2).sum(-1)
+    mels = linear_to_mel(torch.sqrt(power + 1e-6))
 
-    # Convert to mels
-    return linear_to_mel(spectrogram)
+    # Maybe return magnitude spectrogram
+    if return_spectrogram:
+        return mels, torch.sqrt(power)
+    return mels
+
+
+def from_files_to_store(directory, audio_files):
+    """Compute mels from audio files and save to one memory-mapped store
+
+    Mels of all files are written back to back as flattened float16
+    (pyfoal.NUM_MELS, frames) arrays to directory / 'mels.dat'. The offset
+    and number of frames of each file are written to directory / 'mels.json',
+    keyed by the path of the file relative to directory without suffix.
+    """
+    # Get number of frames without loading audio
+    lengths = [
+        pyfoal.convert.samples_to_frames(torchaudio.info(file).num_frames)
+        for file in audio_files]
+
+    # Allocate store
+    store = np.memmap(
+        directory / 'mels.dat',
+        dtype=np.float16,
+        mode='w+',
+        shape=(max(1, pyfoal.NUM_MELS * sum(lengths)),))
+
+    # Write mels
+    index, offset = {}, 0
+    iterator = pyfoal.iterator(
+        zip(audio_files, lengths),
+        f'Computing mels for {directory.name}',
+        total=len(audio_files))
+    for audio_file, frames in iterator:
+        audio = pyfoal.load.audio(audio_file)
+        with torch.inference_mode():
+            mels = from_audio(audio[None])[0, :, :frames]
+        size = pyfoal.NUM_MELS * frames
+        store[offset:offset + size] = mels.numpy().astype(np.float16).ravel()
+        stem = audio_file.relative_to(directory).with_suffix('').as_posix()
+        index[stem] = [offset, frames]
+        offset += size
+    store.flush()
+
+    # Write index
+    with open(directory / 'mels.json', 'w') as file:
+        json.dump(index, file)
 
 
 ###############################################################################
-# Utilities
+# Feature extraction cache
 ###############################################################################
 
 
-def linear_to_mel(spectrogram):
-    # Create mel basis
-    if not hasattr(linear_to_mel, 'mel_basis'):
-        basis = librosa.filters.mel(
+def basis(device, dtype):
+    """Retrieve the mel filterbank for a device and data type"""
+    def create():
+        filterbank = librosa.filters.mel(
             sr=pyfoal.SAMPLE_RATE,
             n_fft=pyfoal.NUM_FFT,
             n_mels=pyfoal.NUM_MELS)
-        basis = torch.from_numpy(basis)
-        basis = basis.to(spectrogram.dtype).to(spectrogram.device)
-        linear_to_mel.basis = basis
+        return torch.from_numpy(filterbank).to(device=device, dtype=dtype)
+    return basis.cache.get((str(device), dtype), create)
+
+
+def cache_stats():
+    """Retrieve statistics of the filterbank and window caches"""
+    return {'basis': basis.cache(), 'window': window.cache()}
+
 
+def reset_cache():
+    """Remove all cached filterbanks and windows"""
+    basis.cache.reset()
+    window.cache.reset()
+
+
+def window(device, dtype):
+    """Retrieve the hann window for a device and data type"""
+    return window.cache.get(
+        (str(device), dtype),
+        lambda: torch.hann_window(
+            pyfoal.WINDOW_SIZE,
+            dtype=dtype,
+            device=device))
+
+
+# One entry per (device, dtype)
+basis.cache = pyfoal.cache.LRU(max_entries=8)
+window.cache = pyfoal.cache.LRU(max_entries=8)
+
+
+###############################################################################
+# Utilities
+###############################################################################
+
+
+def linear_to_mel(spectrogram):
+    """Convert linear spectrogram to log-mels"""
     # Convert to mels
-    melspectrogram = torch.matmul(linear_to_mel.basis, spectrogram)
+    melspectrogram = torch.matmul(
+        basis(spectrogram.device, spectrogram.dtype),
+        spectrogram)
 
     # Apply dynamic range compression
     return torch.log(torch.clamp(melspectrogram, min=1e-5))
@@ -1,8 +1,7 @@
+import math
 import multiprocessing
 import os
 
-import numpy as np
-import scipy
 import torch
 import torchaudio
 
@@ -14,39 +13,146 @@ import pyfoal
 ###############################################################################
 
 
-def from_lengths(phonemes, frames):
-    """Beta-binomial attention prior"""
-    indices = np.arange(0, phonemes)
-    priors = []
-    for i in range(1, frames + 1):
-        a = pyfoal.ATTENTION_PRIOR_SCALE_FACTOR * i
-        b = pyfoal.ATTENTION_PRIOR_SCALE_FACTOR * (frames - i + 1)
-        prior = scipy.stats.betabinom(phonemes - 1, a, b).pmf(indices)
-        priors.append(prior)
-    return torch.tensor(np.array(priors))
+def from_lengths(
+    phonemes,
+    frames,
+    start=0,
+    end=None,
+    device='cpu',
+    dtype=torch.float64):
+    """Beta-binomial attention prior
 
+    The beta-binomial probability mass function is evaluated in the log
+    domain over the full frames x phonemes grid at once.
 
-def from_file(text_file, audio_file):
-    """Compute prior from files on disk"""
-    # Load text
-    text = pyfoal.load.text(text_file)
+    Arguments
+        phonemes : int
+            The number of phonemes
+        frames : int
+            The number of frames
+        start : int
+            The first frame of the prior to compute
+        end : int or None
+            The frame after the last frame of the prior to compute. Defaults
+            to all remaining frames.
+        device : torch.device
+            The device to compute the prior on
+        dtype : torch.dtype
+            The data type of the returned prior
+
+    Returns
+        prior : torch.tensor(shape=(end - start, phonemes))
+            The attention prior
+    """
+    if end is None:
+        end = frames
+
+    # Number of trials
+    trials = phonemes - 1
+
+    # Number of successes
+    # Shape: (1, phonemes)
+    successes = torch.arange(
+        phonemes,
+        dtype=torch.float64,
+        device=device)[None]
+
+    # Beta distribution parameters of each frame
+    # Shape: (end - start, 1)
+    frame = torch.arange(
+        start + 1,
+        end + 1,
+        dtype=torch.float64,
+        device=device)[:, None]
+    alpha = pyfoal.ATTENTION_PRIOR_SCALE_FACTOR * frame
+    beta = pyfoal.ATTENTION_PRIOR_SCALE_FACTOR * (frames - frame + 1)
+
+    # Log-probability mass function
+    # Shape: (end - start, phonemes)
+    log_prior = (
+        math.lgamma(trials + 1) -
+        torch.lgamma(successes + 1) -
+        torch.lgamma(trials - successes + 1) +
+        betaln(successes + alpha, trials - successes + beta) -
+        betaln(alpha, beta))
+
+    return torch.exp(log_prior).to(dtype)
+
+
+def from_lengths_cached(
+    phonemes,
+    frames,
+    device='cpu',
+    dtype=torch.float64):
+    """Beta-binomial attention prior from a bounded cache
+
+    Priors are cached by shape and device with type PRIOR_CACHE_DTYPE. The
+    least-recently-used priors are evicted once PRIOR_CACHE_SIZE bytes are
+    used. Cache statistics are available via from_lengths_cached.cache().
+    The returned prior may be shared with the cache and must not be
+    modified in place.
+    """
+    # Retrieve prior
+    cache_dtype = getattr(torch, pyfoal.PRIOR_CACHE_DTYPE)
+    prior = from_lengths_cached.cache.get(
+        (phonemes, frames, str(device), cache_dtype),
+        lambda: from_lengths(
+            phonemes,
+            frames,
+            device=device,
+            dtype=cache_dtype))
+
+    return prior.to(dtype)
+
+
+def from_file(text_file, audio_file, phonemes=None):
+    """Compute prior from files on disk
+
+    The number of phonemes is computed from the text file unless given.
+    """
+    # Maybe count phonemes
+    if phonemes is None:
+        phonemes = len(pyfoal.g2p.from_text(pyfoal.load.text(text_file))[1])
 
     # Get number of frames without loading audio
     frames = pyfoal.convert.samples_to_frames(
         torchaudio.info(audio_file).num_frames)
 
     # Compute prior
-    return from_lengths(len(pyfoal.g2p.from_text(text)[1]), frames)
+    return from_lengths(phonemes, frames)
 
 
-def from_file_to_file(text_file, audio_file, output_file):
+def from_file_to_file(text_file, audio_file, output_file, phonemes=None):
     """Compute attention prior from files and save"""
-    torch.save(from_file(text_file, audio_file), output_file)
+    torch.save(from_file(text_file, audio_file, phonemes), output_file)
+
 
+def from_files_to_files(
+    text_files,
+    audio_files,
+    output_files,
+    phonemes=None):
+    """Compute attention priors from files and save
 
-def from_files_to_files(text_files, audio_files, output_files):
-    """Compute attention priors from files and save"""
+    If the number of phonemes of each file is given, G2P is not rerun.
+    """
+    if phonemes is None:
+        phonemes = [None] * len(text_files)
     with multiprocessing.Pool(os.cpu_count() // 2) as pool:
         pool.starmap(
             from_file_to_file,
-            zip(text_files, audio_files, output_files))
\ No newline at end of file
+            zip(text_files, audio_files, output_files, phonemes))
+
+
+###############################################################################
+# Utilities
+###############################################################################
+
+
+def betaln(a, b):
+    """Natural logarithm of the beta function"""
+    return torch.lgamma(a) + torch.lgamma(b) - torch.lgamma(a + b)
+
+
+# Priors are cached by shape, device, and data type
+from_lengths_cached.cache = pyfoal.cache.LRU(max_bytes=pyfoal.PRIOR_CACHE_SIZE)
@@ -53,7 +53,7 @@ def datasets(
             file_metrics.reset()
 
             # Unpack
-            _, audio, _, _, _, _, stem, target, text = batch
+            _, audio, _, _, _, _, _, stem, target, text = batch
 
             # Align
             with pyfoal.time.timer('align'):
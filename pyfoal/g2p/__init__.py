@@ -1 +1,2 @@
 from .core import *
+from . import lexicon
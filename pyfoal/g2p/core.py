@@ -1,8 +1,15 @@
+import functools
+import itertools
 import multiprocessing
 import os
+import re
 import string
+import threading
+import unicodedata
 
 import g2p_en
+import nltk
+import numpy as np
 import torch
 
 import pyfoal
@@ -15,43 +22,12 @@ import pyfoal
 
 def from_text(text, to_indices=True, remove_prominence=True):
     """Convert text to cmu"""
-    # Remove newlines, tabs, and extra whitespace
-    text = text.replace('\n', ' ')
-    text = text.replace('\t', ' ')
-    while '  ' in text:
-        text = text.replace('  ', ' ')
+    return from_texts([text], to_indices, remove_prominence)[0]
 
-    # Convert numbers to text
-    text = g2p_en.expand.normalize_numbers(text)
 
-    # Remove punctuation
-    punctuation = [s for s in string.punctuation + '”“—' if s != '-']
-    text = text.translate(str.maketrans('-', ' ', ''.join(punctuation)))
-
-    # Grapheme-to-phoneme conversion
-    phonemes = g2p_en.G2p()(text)
-
-    # Remove prominence markings
-    if remove_prominence:
-        phonemes = [
-            ''.join(c for c in phoneme if not c.isdigit())
-            for phoneme in phonemes]
-
-    # Handle silences
-    phonemes = [
-        '<silent>' if phoneme == ' ' else phoneme for phoneme in phonemes]
-
-    # Ensure start and end have silent tokens
-    if phonemes[0] != '<silent>':
-        phonemes.insert(0, '<silent>')
-    if phonemes[-1] != '<silent>':
-        phonemes.append('<silent>')
-
-    # Maybe convert to indices
-    if to_indices:
-        indices = pyfoal.convert.phonemes_to_indices(phonemes)
-        return text, torch.tensor(indices, dtype=torch.long)
-    return text, phonemes
+def from_texts(texts, to_indices=True, remove_prominence=True):
+    """Convert a batch of texts to cmu, pronouncing each unique word once"""
+    return engine().from_texts(texts, to_indices, remove_prominence)
 
 
 def from_file(text_file):
@@ -65,6 +41,364 @@ def from_file_to_file(text_file, output_file):
 
 
 def from_files_to_files(text_files, output_files):
-    """Convert text on disk to phonemes and save"""
-    with multiprocessing.Pool(os.cpu_count() // 2) as pool:
-        pool.starmap(from_file_to_file, zip(text_files, output_files))
+    """Convert text on disk to phonemes and save
+
+    Each unique normalized transcript is converted once, so the cost scales
+    with the number of unique transcripts rather than files.
+
+    Returns
+        phonemes : list[torch.tensor]
+            The phoneme indices of each file. Files with the same normalized
+            transcript share one tensor.
+    """
+    # Deduplicate transcripts
+    keys = [normalize(pyfoal.load.text(file)) for file in text_files]
+    unique = list(dict.fromkeys(keys))
+
+    # Convert unique transcripts in parallel
+    size = 64
+    chunks = [unique[i:i + size] for i in range(0, len(unique), size)]
+    with multiprocessing.Pool(max(1, os.cpu_count() // 2)) as pool:
+        results = pyfoal.iterator(
+            pool.imap(indices_from_texts, chunks),
+            f'G2P ({len(unique)} unique of {len(keys)} transcripts)',
+            total=len(chunks))
+        pronunciations = {
+            key: torch.tensor(indices, dtype=torch.long)
+            for key, indices in zip(
+                unique,
+                itertools.chain.from_iterable(results))}
+
+    # Save
+    phonemes = [pronunciations[key] for key in keys]
+    for indices, output_file in zip(phonemes, output_files):
+        torch.save(indices, output_file)
+
+    return phonemes
+
+
+def normalize(text):
+    """Normalize transcript so equal normalizations have equal phonemes"""
+    return ' '.join(engine().normalize(text).lower().split())
+
+
+###############################################################################
+# Persistent G2P engine
+###############################################################################
+
+
+class Engine:
+    """Grapheme-to-phoneme converter with a pronunciation cache
+
+    The pronunciation dictionary is loaded once, and the neural model and
+    part-of-speech tagger are loaded once on first use. Pronunciations are
+    cached by word, and additionally by part of speech for homographs.
+
+    Arguments
+        backend : str
+            The G2P backend. One of ['g2p_en', 'lexicon']. The g2p_en backend
+            processes text exactly as g2p_en.G2p. The lexicon backend looks
+            up words in the compact lexicon of pyfoal.g2p.lexicon, only tags
+            parts of speech of texts containing homographs, and only loads
+            the neural model if a word is out of vocabulary.
+        cache_size : int
+            Maximum number of cached pronunciations
+    """
+
+    def __init__(
+        self,
+        backend=pyfoal.G2P_BACKEND,
+        cache_size=pyfoal.G2P_CACHE_SIZE):
+        self.backend = backend
+        self.cache = pyfoal.cache.LRU(max_entries=cache_size)
+        self.lock = threading.Lock()
+        self.neural = None
+        self.tagger = None
+
+        # Load pronunciation dictionary
+        if backend == 'g2p_en':
+            self.dictionary = {
+                word: pronunciations[0]
+                for word, pronunciations in self.model.cmu.items()}
+        elif backend == 'lexicon':
+            self.dictionary = pyfoal.g2p.lexicon.load()
+        else:
+            raise ValueError(f'G2P backend {backend} is not defined')
+        self.homographs = g2p_en.g2p.construct_homograph_dictionary()
+
+        # Remove all punctuation except hyphens, which separate words
+        punctuation = [s for s in string.punctuation + '”“—' if s != '-']
+        self.punctuation = str.maketrans('-', ' ', ''.join(punctuation))
+
+    def __call__(self):
+        """Retrieve pronunciation cache statistics"""
+        return self.cache()
+
+    def from_texts(self, texts, to_indices=True, remove_prominence=True):
+        """Convert a batch of texts to cmu
+
+        Arguments
+            texts : list[str]
+                The texts to convert
+            to_indices : bool
+                Whether to convert phonemes to integer indices
+            remove_prominence : bool
+                Whether to remove stress markings from phonemes
+
+        Returns
+            results : list[tuple[str, torch.tensor or list[str]]]
+                The normalized text and phonemes of each text
+        """
+        # Normalize text
+        texts = [self.normalize(text) for text in texts]
+
+        # Split into words and tag parts of speech
+        sentences = [self.tokenize(text) for text in texts]
+
+        # Pronounce each unique word once
+        keys = {
+            self.key(word, pos)
+            for sentence in sentences
+            for word, pos in sentence}
+
+        # Predict pronunciations of uncached out-of-vocabulary words in one
+        # batch
+        missing = [
+            key for key in keys
+            if key not in self.cache and self.oov(key[0])]
+        predictions = dict(zip(
+            missing,
+            self.predict([word for word, _ in missing])))
+
+        def create(key):
+            """Create the pronunciation of an uncached word"""
+            if key in predictions:
+                return predictions[key]
+            return self.pronounce(*key)
+
+        # Retrieve or create pronunciations
+        pronunciations = {
+            key: self.cache.get(key, functools.partial(create, key))
+            for key in keys}
+
+        # Join pronunciations with silences
+        return [
+            (
+                text,
+                self.join(
+                    [
+                        pronunciations[self.key(word, pos)]
+                        for word, pos in sentence
+                    ],
+                    to_indices,
+                    remove_prominence)
+            )
+            for text, sentence in zip(texts, sentences)]
+
+    def join(self, pronunciations, to_indices=True, remove_prominence=True):
+        """Join word pronunciations into a sequence of phonemes"""
+        # Separate words with spaces
+        phonemes = []
+        for pronunciation in pronunciations:
+            phonemes.extend(pronunciation)
+            phonemes.append(' ')
+        phonemes = phonemes[:-1]
+
+        # Remove prominence markings
+        if remove_prominence:
+            phonemes = [
+                ''.join(c for c in phoneme if not c.isdigit())
+                for phoneme in phonemes]
+
+        # Handle silences
+        phonemes = [
+            '<silent>' if phoneme == ' ' else phoneme for phoneme in phonemes]
+
+        # Ensure start and end have silent tokens
+        if phonemes[0] != '<silent>':
+            phonemes.insert(0, '<silent>')
+        if phonemes[-1] != '<silent>':
+            phonemes.append('<silent>')
+
+        # Maybe convert to indices
+        if to_indices:
+            indices = pyfoal.convert.phonemes_to_indices(phonemes)
+            return torch.tensor(indices, dtype=torch.long)
+        return phonemes
+
+    def key(self, word, pos):
+        """Get the cache key of a word. Only homographs depend on pos."""
+        if word in self.homographs:
+            return word, pos
+        return word, None
+
+    @property
+    def model(self):
+        """The g2p_en model, loaded on first use"""
+        with self.lock:
+            if self.neural is None:
+                self.neural = g2p_en.G2p()
+        return self.neural
+
+    def normalize(self, text):
+        """Normalize whitespace, numbers, and punctuation"""
+        # Remove newlines, tabs, and extra whitespace
+        text = text.replace('\n', ' ')
+        text = text.replace('\t', ' ')
+        while '  ' in text:
+            text = text.replace('  ', ' ')
+
+        # Convert numbers to text
+        text = g2p_en.expand.normalize_numbers(text)
+
+        # Remove punctuation
+        return text.translate(self.punctuation)
+
+    def oov(self, word):
+        """Whether a word is pronounced by the neural model"""
+        return (
+            re.search('[a-z]', word) is not None and
+            word not in self.homographs and
+            word not in self.dictionary)
+
+    def predict(self, words):
+        """Predict pronunciations of out-of-vocabulary words in one batch
+
+        Runs the encoder and decoder of g2p_en.G2p.predict over all words at
+        once instead of one word at a time.
+        """
+        if not words:
+            return []
+        model = self.model
+
+        # Pad characters
+        lengths = np.array([len(word) + 1 for word in words])
+        indices = np.full(
+            (len(words), lengths.max()),
+            model.g2idx['<pad>'],
+            dtype=np.int64)
+        for i, word in enumerate(words):
+            indices[i, :lengths[i]] = [
+                model.g2idx.get(char, model.g2idx['<unk>'])
+                for char in list(word) + ['</s>']]
+
+        # Encode. Padding follows the end of each word, so the hidden state
+        # at the end of each word is unaffected by it.
+        encoded = model.gru(
+            np.take(model.enc_emb, indices, axis=0),
+            lengths.max(),
+            model.enc_w_ih,
+            model.enc_w_hh,
+            model.enc_b_ih,
+            model.enc_b_hh,
+            h0=np.zeros(
+                (len(words), model.enc_w_hh.shape[-1]),
+                np.float32))
+        hidden = encoded[np.arange(len(words)), lengths - 1]
+
+        # Decode greedily, starting from <s>
+        decoded = np.full(len(words), 2)
+        predictions = [[] for _ in words]
+        active = np.ones(len(words), dtype=bool)
+        for _ in range(20):
+            hidden = model.grucell(
+                np.take(model.dec_emb, decoded, axis=0),
+                hidden,
+                model.dec_w_ih,
+                model.dec_w_hh,
+                model.dec_b_ih,
+                model.dec_b_hh)
+            logits = np.matmul(hidden, model.fc_w.T) + model.fc_b
+            decoded = logits.argmax(axis=-1)
+
+            # Stop each word at </s>
+            active &= decoded != 3
+            if not active.any():
+                break
+            for i in np.where(active)[0]:
+                predictions[i].append(int(decoded[i]))
+
+        return [
+            [model.idx2p.get(index, '<unk>') for index in prediction]
+            for prediction in predictions]
+
+    def pronounce(self, word, pos=None):
+        """Pronounce one lowercase word"""
+        # Pass through tokens without letters
+        if re.search('[a-z]', word) is None:
+            return [word]
+
+        # Disambiguate homographs by part of speech
+        if word in self.homographs:
+            pronunciation, alternate, part = self.homographs[word]
+            return pronunciation if pos.startswith(part) else alternate
+
+        # Look up pronunciation dictionary
+        if word in self.dictionary:
+            return self.dictionary[word]
+
+        # Predict pronunciation of out-of-vocabulary word
+        return self.predict([word])[0]
+
+    def tag(self, words):
+        """Tag words with parts of speech"""
+        with self.lock:
+            if self.tagger is None:
+                self.tagger = nltk.tag.PerceptronTagger()
+        return self.tagger.tag(words)
+
+    def tokenize(self, text):
+        """Split text into lowercase words tagged with parts of speech
+
+        Matches the preprocessing of g2p_en.G2p. Parts of speech are None
+        if they are not needed.
+        """
+        # Strip accents
+        text = ''.join(
+            char for char in unicodedata.normalize('NFD', text)
+            if unicodedata.category(char) != 'Mn')
+
+        # Lexicon backend
+        if self.backend == 'lexicon':
+
+            # Numbers and punctuation are already removed by normalize, so
+            # only letters and spaces remain after removing other characters
+            words = re.sub('[^ a-z]', '', text.lower()).split()
+
+            # Tag parts of speech only if needed to disambiguate homographs
+            if any(word in self.homographs for word in words):
+                return self.tag(words)
+            return [(word, None) for word in words]
+
+        # Convert numbers to text
+        text = g2p_en.expand.normalize_numbers(text)
+
+        # Remove unsupported characters
+        text = text.lower()
+        text = re.sub("[^ a-z'.,?!\\-]", '', text)
+        text = text.replace('i.e.', 'that is')
+        text = text.replace('e.g.', 'for example')
+
+        # Tag parts of speech
+        return self.tag(g2p_en.g2p.word_tokenize(text))
+
+
+###############################################################################
+# Utilities
+###############################################################################
+
+
+def engine():
+    """Retrieve the shared G2P engine, creating it on first use"""
+    with engine.lock:
+        if not hasattr(engine, 'instance'):
+            engine.instance = Engine()
+    return engine.instance
+
+
+def indices_from_texts(texts):
+    """Convert a batch of texts to lists of phoneme indices"""
+    return [phonemes.tolist() for _, phonemes in from_texts(texts)]
+
+
+engine.lock = threading.Lock()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import threading
+
+import nltk
+
+import pyfoal
+
+
+###############################################################################
+# Pronunciation lexicon
+###############################################################################
+
+
+def load(file=None):
+    """Load the pronunciation lexicon, compiling it on first use
+
+    Arguments
+        file : Path or None
+            The lexicon file. Defaults to cmudict.txt in the g2p directory of
+            pyfoal.CACHE_DIR.
+
+    Returns
+        lexicon : dict[str, tuple[str]]
+            The first CMUdict pronunciation of each lowercase word
+    """
+    if file is None:
+        file = pyfoal.CACHE_DIR / 'g2p' / 'cmudict.txt'
+
+    with load.lock:
+        if file not in load.lexicons:
+
+            # Load from disk
+            if file.exists():
+                with open(file, encoding='utf-8') as lines:
+                    load.lexicons[file] = {
+                        word: tuple(phonemes)
+                        for word, *phonemes in map(str.split, lines)}
+
+            # Compile and save for next time
+            else:
+                load.lexicons[file] = from_cmudict()
+                try:
+                    save(load.lexicons[file], file)
+                except OSError:
+                    pass
+
+        return load.lexicons[file]
+
+
+###############################################################################
+# Utilities
+###############################################################################
+
+
+def from_cmudict():
+    """Compile the first CMUdict pronunciation of each word"""
+    return {
+        word: tuple(pronunciations[0])
+        for word, pronunciations in nltk.corpus.cmudict.dict().items()}
+
+
+def save(lexicon, file):
+    """Save a lexicon as one line per word of space-separated phonemes
+
+    The lexicon is written to a temporary file that is then renamed, so
+    concurrent processes never read a partially written lexicon.
+    """
+    file.parent.mkdir(exist_ok=True, parents=True)
+    with tempfile.NamedTemporaryFile(
+        'w',
+        encoding='utf-8',
+        dir=file.parent,
+        suffix='.tmp',
+        delete=False
+    ) as lines:
+        for word, phonemes in sorted(lexicon.items()):
+            lines.write(f'{word} {" ".join(phonemes)}\n')
+    os.replace(lines.name, file)
+
+
+# Lexicons are loaded once per file
+load.lexicons = {}
+load.lock = threading.Lock()
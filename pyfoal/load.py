@@ -19,6 +19,14 @@ def audio(file):
     return pyfoal.resample(audio, sample_rate)
 
 
+def mel_index(directory):
+    """Load the offset and number of frames of each stem in a mel store"""
+    if not (directory / 'mels.json').exists():
+        return None
+    with open(directory / 'mels.json') as file:
+        return json.load(file)
+
+
 def partition(dataset):
     """Load partitions for dataset"""
     with open(pyfoal.PARTITION_DIR / f'{dataset}.json') as file:
@@ -1,7 +1,3 @@
-import warnings
-
-import librosa
-import numpy as np
 import torch
 
 import pyfoal
@@ -18,6 +14,9 @@ MIN_DB = -100.
 # Reference decibel level
 REF_DB = 20.
 
+# Dynamic range below the loudest bin of each utterance
+TOP_DB = 80.
+
 
 ###############################################################################
 # A-weighted loudness
@@ -25,51 +24,93 @@ REF_DB = 20.
 
 
 def from_audio(audio):
-    """Retrieve the per-frame loudness"""
-    # Save device
-    device = audio.device
+    """Retrieve the per-frame loudness
+
+    Arguments
+        audio : torch.tensor(shape=(batch, 1, samples) or (batch, samples))
+            The speech signal
 
+    Returns
+        loudness : torch.tensor(shape=(batch, frames))
+            The A-weighted loudness in decibels on the device of the audio
+    """
     # Pad
     padding = (pyfoal.WINDOW_SIZE - pyfoal.HOPSIZE) // 2
     audio = torch.nn.functional.pad(audio, (padding, padding))
 
-    # Convert to numpy
-    audio = audio.detach().cpu().numpy().squeeze(0)
-
-    # Cache weights
-    if not hasattr(from_audio, 'weights'):
-        from_audio.weights = perceptual_weights()
-
     # Take stft
-    stft = librosa.stft(
-        audio,
-        n_fft=pyfoal.WINDOW_SIZE,
+    stft = torch.stft(
+        audio.reshape(-1, audio.shape[-1]),
+        pyfoal.WINDOW_SIZE,
         hop_length=pyfoal.HOPSIZE,
         win_length=pyfoal.WINDOW_SIZE,
-        center=False)
+        window=pyfoal.data.preprocess.mels.window(audio.device, audio.dtype),
+        center=False,
+        return_complex=True)
 
+    # Compute loudness from magnitude
+    return from_spectrogram(stft.abs())
+
+
+def from_spectrogram(spectrogram):
+    """Retrieve the per-frame loudness from a magnitude spectrogram
+
+    Arguments
+        spectrogram : torch.tensor(shape=(batch, 1 + WINDOW_SIZE // 2, frames))
+            The magnitude spectrogram, such as the one computed alongside
+            the mels of the model input
+
+    Returns
+        loudness : torch.tensor(shape=(batch, frames))
+            The A-weighted loudness in decibels
+    """
     # Compute magnitude on db scale
-    db = librosa.amplitude_to_db(np.abs(stft))
+    db = 20. * torch.log10(torch.clamp(spectrogram, min=1e-5))
+
+    # Limit dynamic range of each utterance
+    peak = db.amax(dim=(1, 2), keepdim=True)
+    db = torch.maximum(db, peak - TOP_DB)
 
     # Apply A-weighting
-    weighted = db + from_audio.weights
+    weighted = db + perceptual_weights(spectrogram.device, spectrogram.dtype)
 
     # Threshold
-    weighted[weighted < MIN_DB] = MIN_DB
+    weighted = torch.clamp(weighted, min=MIN_DB)
 
     # Average over weighted frequencies
-    return torch.from_numpy(weighted.mean(axis=0)).float().to(device)[None]
+    return weighted.mean(dim=1)
 
 
-def perceptual_weights():
+def perceptual_weights(device='cpu', dtype=torch.float):
     """A-weighted frequency-dependent perceptual loudness weights"""
-    frequencies = librosa.fft_frequencies(
-        sr=pyfoal.SAMPLE_RATE,
-        n_fft=pyfoal.WINDOW_SIZE)
-
-    # A warning is raised for nearly inaudible frequencies, but it ends up
-    # defaulting to -100 db. That default is fine for our purposes.
-    with warnings.catch_warnings():
-        warnings.simplefilter('ignore', RuntimeWarning)
-        return librosa.A_weighting(frequencies)[:, None] - REF_DB
-    
\ No newline at end of file
+    def create():
+        frequencies = torch.linspace(
+            0,
+            pyfoal.SAMPLE_RATE / 2,
+            1 + pyfoal.WINDOW_SIZE // 2,
+            dtype=torch.float64)
+
+        # IEC 61672 A-weighting curve
+        squared = frequencies ** 2
+        constants = torch.tensor(
+            [12194.217, 20.598997, 107.65265, 737.86223],
+            dtype=torch.float64) ** 2
+        weights = 2. + 20. * (
+            torch.log10(constants[0]) +
+            2 * torch.log10(squared) -
+            torch.log10(squared + constants[0]) -
+            torch.log10(squared + constants[1]) -
+            .5 * torch.log10(squared + constants[2]) -
+            .5 * torch.log10(squared + constants[3]))
+
+        # Nearly inaudible frequencies, including 0 Hz where the curve is
+        # -inf, default to -80 dB. That default is fine for our purposes.
+        weights = torch.clamp(weights, min=-80.)
+
+        return (weights[:, None] - REF_DB).to(device=device, dtype=dtype)
+
+    return perceptual_weights.cache.get((str(device), dtype), create)
+
+
+# One entry per (device, dtype)
+perceptual_weights.cache = pyfoal.cache.LRU(max_entries=8)
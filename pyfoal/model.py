@@ -20,33 +20,40 @@ class Model(torch.nn.Module):
         # Mel encoding
         self.query_encoder = MelEncoder()
 
-    def forward(self, phonemes, audio, prior=None, mask=None):
-        # Compute melspectrogram
-        # Input shape: (batch, 1, audio.shape[-1])
-        # Output shape: (
-        #   batch,
-        #   pyfoal.NUM_MELS,
-        #   pyfoal.convert.samples_to_frames(audio.shape[-1]))
-        mels = pyfoal.data.preprocess.mels.from_audio(audio)
+    def forward(self, phonemes, audio=None, prior=None, mask=None, mels=None):
+        # Encode mels and phonemes
+        query, key = self.encode(phonemes, audio, mels)
+
+        # Compute attention
+        attention = self.attend(query, key, prior, mask)
 
+        # Apply mask
+        if mask is not None:
+            attention.data.masked_fill_(~mask.to(torch.bool), -float('inf'))
+
+        return attention
+
+    def attend(self, query, key, prior=None, mask=None):
+        """Compute attention between encoded mels and phonemes
+
+        Phonemes that are masked for every frame are padding and are
+        excluded from normalization.
+        """
         # Isotropic Gaussian attention
         # Input shape: (
-        #   (batch, pyfoal.NUM_MELS, mels.shape[-1]),
-        #   (batch, 1, phonemes.shape[-1]))
-        # Output shape: (
-        #   batch, pyfoal.NUM_MELS, mels.shape[-1], phonemes.shape[-1])
-        attention = (
-            (
-                self.query_encoder(mels)[:, :, :, None] -
-                self.key_encoder(phonemes)[:, :, None]
-            ) ** 2
-        )
-
-        # Sum over channels and scale
-        # Input shape: (
-        #   batch, pyfoal.NUM_MELS, mels.shape[-1], phonemes.shape[-1])
-        # Output shape: (batch, mels.shape[-1], phonemes.shape[-1])
-        attention = -pyfoal.TEMPERATURE * attention.sum(1)
+        #   (batch, pyfoal.ATTENTION_WIDTH, frames),
+        #   (batch, pyfoal.ATTENTION_WIDTH, phonemes))
+        # Output shape: (batch, frames, phonemes)
+        attention = distance(query, key)
+
+        # Scale
+        attention = -pyfoal.TEMPERATURE * attention
+
+        # Maybe remove padded phonemes
+        if mask is not None:
+            attention = attention.masked_fill(
+                ~mask.to(torch.bool).any(dim=1, keepdim=True),
+                -float('inf'))
 
         # Maybe add a prior distribution
         if prior is not None:
@@ -54,18 +61,60 @@ class Model(torch.nn.Module):
                 torch.nn.functional.log_softmax(attention, dim=2) +
                 pyfoal.PRIOR_WEIGHT * torch.log(prior + 1e-8))
 
-        # Apply mask
-        if mask is not None:
-            attention.data.masked_fill_(~mask.to(torch.bool), -float('inf'))
-
         return attention
 
+    def encode(self, phonemes, audio=None, mels=None):
+        """Encode mels and phonemes for attention
+
+        Mels are computed from audio unless precomputed mels are given.
+        """
+        # Maybe compute melspectrogram
+        # Input shape: (batch, 1, audio.shape[-1])
+        # Output shape: (
+        #   batch,
+        #   pyfoal.NUM_MELS,
+        #   pyfoal.convert.samples_to_frames(audio.shape[-1]))
+        if mels is None:
+            mels = pyfoal.data.preprocess.mels.from_audio(audio)
+
+        # Encode
+        # Input shape: (
+        #   (batch, pyfoal.NUM_MELS, mels.shape[-1]),
+        #   (batch, 1, phonemes.shape[-1]))
+        # Output shape: (
+        #   (batch, pyfoal.ATTENTION_WIDTH, mels.shape[-1]),
+        #   (batch, pyfoal.ATTENTION_WIDTH, phonemes.shape[-1]))
+        return self.query_encoder(mels), self.key_encoder(phonemes)
+
 
 ###############################################################################
 # Utilities
 ###############################################################################
 
 
+def distance(query, key):
+    """Squared euclidean distance between all pairs of query and key vectors
+
+    Expands ||q - k||^2 as ||q||^2 + ||k||^2 - 2 q.k so that the cross term
+    is one batched matrix multiply and no (batch, channels, frames, phonemes)
+    tensor is materialized. Computed in single precision, as the expansion
+    is prone to cancellation in half precision.
+    """
+    with torch.autocast(query.device.type, enabled=False):
+        query, key = query.float(), key.float()
+
+        # Input shape: ((batch, channels, frames), (batch, channels, phonemes))
+        # Output shape: (batch, frames, phonemes)
+        distances = torch.baddbmm(
+            (query ** 2).sum(1)[:, :, None] + (key ** 2).sum(1)[:, None],
+            query.transpose(1, 2),
+            key,
+            alpha=-2.)
+
+        # Distances are nonnegative up to rounding error
+        return torch.clamp(distances, min=0.)
+
+
 class MelEncoder(torch.nn.Sequential):
 
     def __init__(self):
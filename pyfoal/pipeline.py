@@ -0,0 +1,438 @@
+import collections
+import concurrent.futures
+import math
+import multiprocessing
+import os
+import time
+
+import torch
+import torchaudio
+import tqdm
+
+import pyfoal
+
+
+###############################################################################
+# Pipelined RAD-TTS alignment
+###############################################################################
+
+
+def from_files_to_files(
+    text_files,
+    audio_files,
+    output_files,
+    checkpoint=pyfoal.DEFAULT_CHECKPOINT,
+    gpu=None,
+    batch_size=pyfoal.INFERENCE_BATCH_SIZE,
+    memory_budget=pyfoal.INFERENCE_MEMORY_BUDGET,
+    num_workers=None):
+    """Align many files, overlapping loading, inference, and decoding
+
+    A thread pool reads transcripts and audio and runs G2P, the model runs
+    on batches of similar length, and batches are decoded and saved. Stages
+    are connected by bounded queues, so a slow stage stalls the stages
+    before it instead of accumulating work.
+
+    On GPU, the calling process runs the model and a process pool decodes.
+    On CPU, files are split across worker processes that share one copy of
+    the model in shared memory. Each worker is pinned to its own slice of
+    cores and runs all stages.
+
+    Arguments
+        text_files : list
+            The transcript files
+        audio_files : list
+            The corresponding speech audio files
+        output_files : list
+            The files to save the alignments
+        checkpoint : Path
+            The model checkpoint
+        gpu : int
+            The index of the gpu to perform inference on
+        batch_size : int
+            The maximum number of files per batch
+        memory_budget : int
+            The maximum size in bytes of the network output of a batch
+        num_workers : int
+            The number of decoding processes on GPU or inference processes
+            on CPU. Defaults to all cores but one on GPU and all cores on
+            CPU, with at most one inference process per core.
+
+    Returns
+        utilization : dict
+            The fraction of time each stage was busy
+    """
+    # Load files in order of duration so that batches have similar lengths
+    frames = [pyfoal.audio_file_frames(file) for file in audio_files]
+    order = sorted(range(len(audio_files)), key=frames.__getitem__)
+
+    # Multi-process CPU inference
+    if gpu is None:
+        return from_files_to_files_cpu(
+            order,
+            text_files,
+            audio_files,
+            output_files,
+            checkpoint,
+            batch_size,
+            memory_budget,
+            num_workers)
+
+    if num_workers is None:
+        num_workers = max(1, os.cpu_count() - 1)
+
+    # GPU inference with a decoding process pool
+    busy = {'load': 0., 'infer': 0., 'decode': 0.}
+    progress = tqdm.tqdm(
+        desc='Aligning',
+        dynamic_ncols=True,
+        total=len(text_files))
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(
+        num_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=initialize
+    ) as decoders:
+        align(
+            order,
+            text_files,
+            audio_files,
+            output_files,
+            checkpoint,
+            torch.device(f'cuda:{gpu}'),
+            batch_size,
+            memory_budget,
+            busy,
+            progress,
+            decoders,
+            num_workers)
+    progress.close()
+
+    # Report utilization
+    return report(
+        busy,
+        time.perf_counter() - start,
+        {'load': pyfoal.INFERENCE_LOAD_THREADS, 'decode': num_workers})
+
+
+def from_files_to_files_cpu(
+    order,
+    text_files,
+    audio_files,
+    output_files,
+    checkpoint=pyfoal.DEFAULT_CHECKPOINT,
+    batch_size=pyfoal.INFERENCE_BATCH_SIZE,
+    memory_budget=pyfoal.INFERENCE_MEMORY_BUDGET,
+    num_workers=None):
+    """Align many files on CPU across processes sharing one model"""
+    # Split available cores between workers
+    cores = sorted(
+        os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity')
+        else range(os.cpu_count()))
+    if num_workers is None:
+        num_workers = len(cores)
+    num_workers = max(1, min(num_workers, len(cores), len(order)))
+    size = len(cores) // num_workers
+
+    # Load the checkpoint once into shared memory
+    model, *_ = pyfoal.checkpoint.load(checkpoint, pyfoal.Model())
+    model.share_memory()
+
+    # Split files between workers such that each gets a similar mix of
+    # durations
+    busy = {'load': 0., 'infer': 0., 'decode': 0.}
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(
+        num_workers,
+        mp_context=torch.multiprocessing.get_context('spawn')
+    ) as workers:
+        futures = [
+            workers.submit(
+                worker,
+                rank,
+                model,
+                checkpoint,
+                order[rank::num_workers],
+                text_files,
+                audio_files,
+                output_files,
+                cores[rank * size:(rank + 1) * size],
+                batch_size,
+                memory_budget)
+            for rank in range(num_workers)]
+        for future in concurrent.futures.as_completed(futures):
+            for stage, elapsed in future.result().items():
+                busy[stage] += elapsed
+
+    # Report utilization
+    return report(
+        busy,
+        time.perf_counter() - start,
+        {
+            'load': num_workers * pyfoal.INFERENCE_LOAD_THREADS,
+            'infer': num_workers,
+            'decode': num_workers})
+
+
+def worker(
+    rank,
+    model,
+    checkpoint,
+    order,
+    text_files,
+    audio_files,
+    output_files,
+    cores,
+    batch_size,
+    memory_budget):
+    """Align files in a CPU inference process pinned to a slice of cores"""
+    # Pin to cores
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+    # Use the shared model for inference
+    device = torch.device('cpu')
+    model = model.eval().requires_grad_(False)
+
+    # Align
+    busy = {'load': 0., 'infer': 0., 'decode': 0.}
+    progress = tqdm.tqdm(
+        desc=f'Aligning (worker {rank})',
+        dynamic_ncols=True,
+        position=rank,
+        total=len(order))
+    align(
+        order,
+        text_files,
+        audio_files,
+        output_files,
+        checkpoint,
+        device,
+        batch_size,
+        memory_budget,
+        busy,
+        progress,
+        model=model)
+    progress.close()
+
+    return busy
+
+
+###############################################################################
+# Pipeline stages
+###############################################################################
+
+
+def align(
+    order,
+    text_files,
+    audio_files,
+    output_files,
+    checkpoint,
+    device,
+    batch_size,
+    memory_budget,
+    busy,
+    progress,
+    decoders=None,
+    num_workers=1,
+    model=None):
+    """Load, infer, and decode files in order, accumulating busy time
+
+    Batches are decoded in the calling process if decoders is None. The
+    checkpoint is loaded unless a model is given.
+    """
+    order = iter(order)
+
+    # Maximum number of frame and phoneme pairs of a batch
+    cells = pyfoal.cells(memory_budget)
+
+    with concurrent.futures.ThreadPoolExecutor(
+        pyfoal.INFERENCE_LOAD_THREADS
+    ) as loaders:
+        loading, decoding = collections.deque(), collections.deque()
+
+        def fill():
+            """Keep a bounded number of files loading"""
+            while len(loading) < 2 * batch_size:
+                i = next(order, None)
+                if i is None:
+                    return
+                future = loaders.submit(load, text_files[i], audio_files[i])
+                loading.append((i, future))
+
+        def drain(size):
+            """Wait for decoding until at most size batches are pending"""
+            while len(decoding) > size:
+                elapsed, count = decoding.popleft().result()
+                busy['decode'] += elapsed
+                progress.update(count)
+
+        def flush(batch):
+            """Run inference on a batch and queue it for decoding"""
+            if not batch:
+                return
+            indices, phonemes, audio, sample_rates = zip(*batch)
+            files = [output_files[i] for i in indices]
+
+            # Resample
+            resample_start = time.perf_counter()
+            audio = resample(audio, sample_rates)
+            busy['load'] += time.perf_counter() - resample_start
+
+            # Align in chunks of frames if too long to batch
+            if (
+                len(batch) == 1 and
+                pyfoal.chunk_size(len(phonemes[0]), memory_budget) <
+                pyfoal.convert.samples_to_frames(audio[0].shape[-1])
+            ):
+                infer_start = time.perf_counter()
+                pyfoal.infer_chunked(
+                    phonemes[0][None, None].to(device),
+                    audio[0][None].to(device),
+                    checkpoint,
+                    model=model,
+                    memory_budget=memory_budget).save(files[0])
+                busy['infer'] += time.perf_counter() - infer_start
+                progress.update()
+                return
+
+            # Pad
+            (
+                phonemes,
+                audio,
+                phoneme_lengths,
+                frame_lengths
+            ) = pyfoal.pad_batch(phonemes, audio)
+
+            # Infer
+            infer_start = time.perf_counter()
+            logits = pyfoal.infer_batch(
+                phonemes.to(device),
+                audio.to(device),
+                phoneme_lengths,
+                frame_lengths,
+                checkpoint,
+                model=model).float().cpu()
+            busy['infer'] += time.perf_counter() - infer_start
+
+            # Audio is only needed for loudness
+            args = (
+                phonemes,
+                logits,
+                None if pyfoal.ALLOW_LOUD_SILENCE else audio,
+                phoneme_lengths,
+                frame_lengths,
+                files)
+
+            # Maybe decode in this process
+            if decoders is None:
+                elapsed, count = decode(*args)
+                busy['decode'] += elapsed
+                progress.update(count)
+
+            # Queue for decoding
+            else:
+                decoding.append(decoders.submit(decode, *args))
+                drain(2 * num_workers)
+
+        # Group loaded files into batches within budget
+        fill()
+        batch, longest, widest = [], 0, 0
+        while loading:
+            i, future = loading.popleft()
+            phonemes, audio, sample_rate, elapsed = future.result()
+            busy['load'] += elapsed
+            fill()
+
+            # Maybe start a new batch
+            length = pyfoal.convert.samples_to_frames(math.ceil(
+                audio.shape[-1] * pyfoal.SAMPLE_RATE / sample_rate))
+            if batch and (
+                len(batch) == batch_size or
+                (len(batch) + 1) *
+                max(longest, length) *
+                max(widest, len(phonemes)) > cells
+            ):
+                flush(batch)
+                batch, longest, widest = [], 0, 0
+
+            # Add to batch
+            batch.append((i, phonemes, audio, sample_rate))
+            longest = max(longest, length)
+            widest = max(widest, len(phonemes))
+        flush(batch)
+
+        # Wait for decoding to finish
+        drain(0)
+
+
+def decode(
+    phonemes,
+    logits,
+    audio,
+    phoneme_lengths,
+    frame_lengths,
+    output_files):
+    """Decode a batch of network outputs and save the alignments"""
+    start = time.perf_counter()
+
+    # Decode
+    alignments = pyfoal.postprocess_batch(
+        phonemes,
+        logits,
+        audio,
+        phoneme_lengths,
+        frame_lengths)
+
+    # Save
+    for alignment, output_file in zip(alignments, output_files):
+        alignment.save(output_file)
+
+    return time.perf_counter() - start, len(output_files)
+
+
+def initialize():
+    """Initialize a decoding process"""
+    # Decoding processes already use all cores, so avoid oversubscription
+    torch.set_num_threads(1)
+
+
+def load(text_file, audio_file):
+    """Load a transcript and audio file and convert the text to phonemes
+
+    Audio is not resampled, so that clips of a batch with the same sample
+    rate can be resampled together.
+    """
+    start = time.perf_counter()
+    phonemes = pyfoal.g2p.from_text(pyfoal.load.text(text_file))[1]
+    audio, sample_rate = torchaudio.load(audio_file)
+    return phonemes, audio, sample_rate, time.perf_counter() - start
+
+
+###############################################################################
+# Utilities
+###############################################################################
+
+
+def report(busy, elapsed, workers):
+    """Print and return the fraction of time each stage was busy"""
+    utilization = {
+        stage: seconds / (elapsed * workers.get(stage, 1))
+        for stage, seconds in busy.items()}
+    for stage, fraction in utilization.items():
+        print(f'{stage}: {100 * fraction:.1f}% utilized')
+    return utilization
+
+
+def resample(audio, sample_rates):
+    """Resample clips, batching clips with the same sample rate"""
+    audio = list(audio)
+    for sample_rate in set(sample_rates):
+        group = [
+            i for i, rate in enumerate(sample_rates) if rate == sample_rate]
+        clips = pyfoal.resample_batch([audio[i] for i in group], sample_rate)
+        for i, clip in zip(group, clips):
+            audio[i] = clip
+    return audio
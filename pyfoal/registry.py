@@ -0,0 +1,180 @@
+import threading
+import time
+from pathlib import Path
+
+import torch
+
+import pyfoal
+
+
+###############################################################################
+# Model registry
+###############################################################################
+
+
+def get(checkpoint=pyfoal.DEFAULT_CHECKPOINT, device='cpu'):
+    """Retrieve a model for inference, loading it if it is not resident
+
+    Models are keyed by checkpoint, configuration, and device. The least
+    recently used models are evicted when more than pyfoal.MODEL_CACHE_ENTRIES
+    models or pyfoal.MODEL_CACHE_SIZE bytes are resident.
+
+    Arguments
+        checkpoint : Path
+            The model checkpoint
+        device : torch.device or string
+            The inference device
+
+    Returns
+        model : pyfoal.Model
+            The model in evaluation mode
+    """
+    device = torch.device(device)
+    key = cache_key(checkpoint, device)
+
+    # Only one thread loads each model
+    with key_lock(key):
+        return cache.get(key, lambda: load(checkpoint, device))
+
+
+def preload(
+    checkpoints=(pyfoal.DEFAULT_CHECKPOINT,),
+    devices=('cpu',),
+    warmup=True):
+    """Load models ahead of time and optionally warm them up
+
+    Arguments
+        checkpoints : list[Path]
+            The model checkpoints
+        devices : list[torch.device or string]
+            The inference devices to load each checkpoint onto
+        warmup : bool
+            Whether to run a forward pass on each model
+
+    Returns
+        elapsed : dict
+            Seconds spent loading and warming up each checkpoint and device
+    """
+    elapsed = {}
+    for checkpoint in checkpoints:
+        for device in devices:
+            start = time.perf_counter()
+
+            # Load
+            model = get(checkpoint, device)
+
+            # Maybe warmup
+            if warmup:
+                pyfoal.registry.warmup(model, checkpoint)
+
+            elapsed[cache_key(checkpoint, device)] = \
+                time.perf_counter() - start
+    return elapsed
+
+
+def put(model, checkpoint=pyfoal.DEFAULT_CHECKPOINT, device='cpu'):
+    """Register a model that was loaded elsewhere (e.g., in shared memory)"""
+    model = model.to(device).eval().requires_grad_(False)
+    cache.put(cache_key(checkpoint, torch.device(device)), model)
+    return model
+
+
+def reset():
+    """Evict all models and reset statistics"""
+    cache.reset()
+    with load.lock:
+        load.count = 0
+        load.seconds = 0.
+
+
+def stats():
+    """Retrieve registry statistics
+
+    Returns
+        stats : dict
+            Cache statistics, the number of models loaded from disk, and the
+            total seconds spent loading them
+    """
+    with load.lock:
+        return {**cache(), 'loads': load.count, 'load-seconds': load.seconds}
+
+
+def warmup(
+    model,
+    checkpoint=pyfoal.DEFAULT_CHECKPOINT,
+    frames=500,
+    phonemes=50):
+    """Run a forward pass to initialize kernels and feature caches"""
+    device = next(model.parameters()).device
+
+    # Random inputs
+    indices = torch.randint(
+        len(pyfoal.load.phonemes()),
+        (1, 1, phonemes),
+        device=device)
+    audio = torch.zeros((1, frames * pyfoal.HOPSIZE), device=device)
+
+    # Forward pass
+    pyfoal.infer(indices, audio, checkpoint, model=model)
+
+    # Maybe wait for asynchronous kernels
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+###############################################################################
+# Utilities
+###############################################################################
+
+
+def cache_key(checkpoint, device):
+    """Get the registry key of a checkpoint and device"""
+    return Path(checkpoint).resolve(), pyfoal.CONFIG, torch.device(device)
+
+
+def key_lock(key):
+    """Get the lock that serializes loading one model"""
+    with key_lock.lock:
+        if key not in key_lock.locks:
+            key_lock.locks[key] = threading.Lock()
+        return key_lock.locks[key]
+
+
+def load(checkpoint, device):
+    """Load a model from disk for inference"""
+    start = time.perf_counter()
+
+    # Load
+    model, *_ = pyfoal.checkpoint.load(checkpoint, pyfoal.Model())
+
+    # Move model to device and freeze
+    model = model.to(device).eval().requires_grad_(False)
+
+    # Update load metrics
+    with load.lock:
+        load.count += 1
+        load.seconds += time.perf_counter() - start
+
+    return model
+
+
+def nbytes(model):
+    """Get the size of the parameters and buffers of a model in bytes"""
+    return pyfoal.cache.nbytes(
+        list(model.parameters()) + list(model.buffers()))
+
+
+# Resident models
+cache = pyfoal.cache.LRU(
+    max_entries=pyfoal.MODEL_CACHE_ENTRIES,
+    max_bytes=pyfoal.MODEL_CACHE_SIZE,
+    size=nbytes)
+
+# Per-model load locks
+key_lock.lock = threading.Lock()
+key_lock.locks = {}
+
+# Load metrics
+load.count = 0
+load.lock = threading.Lock()
+load.seconds = 0.
@@ -0,0 +1,162 @@
+import concurrent.futures
+import torch
+
+import pyfoal
+
+
+###############################################################################
+# Aligner session
+###############################################################################
+
+
+class AlignerSession:
+    """Thread-safe RAD-TTS forced aligner
+
+    Owns a model in evaluation mode, a G2P engine, and a pool of threads
+    that run queued alignments. The model is never switched back to
+    training mode, so any number of threads can align concurrently, either
+    through the session threads or by calling from_text_and_audio directly.
+    Resamplers, analysis windows, mel filterbanks, and attention priors are
+    kept in process-wide thread-safe caches that sessions share.
+
+    Arguments
+        checkpoint : Path
+            The model checkpoint
+        gpu : int or None
+            The index of the gpu to perform inference on
+        threads : int
+            The number of alignments to run concurrently
+        num_threads : int or None
+            The number of torch intra-op threads. This is a process-wide
+            setting that is applied when the session is created and affects
+            all threads and sessions. Unchanged if None.
+    """
+
+    def __init__(
+        self,
+        checkpoint=pyfoal.DEFAULT_CHECKPOINT,
+        gpu=None,
+        threads=1,
+        num_threads=None):
+        self.checkpoint = checkpoint
+        self.device = torch.device('cpu' if gpu is None else f'cuda:{gpu}')
+
+        # Maybe set the process-wide number of intra-op threads
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+
+        # Load model for inference. The model is retrieved from the registry
+        # on each alignment, so evicting it frees its memory.
+        pyfoal.registry.get(checkpoint, self.device)
+
+        # Grapheme-to-phoneme
+        self.g2p = pyfoal.g2p.Engine()
+
+        # Alignment threads
+        self.executor = concurrent.futures.ThreadPoolExecutor(threads)
+
+    def __call__(self):
+        """Retrieve cache statistics"""
+        return {
+            'g2p': self.g2p(),
+            'mels': pyfoal.data.preprocess.mels.cache_stats(),
+            'models': pyfoal.registry.stats(),
+            'priors': pyfoal.data.preprocess.prior.from_lengths_cached.cache(),
+            'resamplers': pyfoal.resampler.cache()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Wait for pending alignments and stop the alignment threads"""
+        self.executor.shutdown()
+
+    def from_text_and_audio(self, text, audio, sample_rate):
+        """Phoneme-level forced-alignment in the calling thread
+
+        Arguments
+            text : string
+                The speech transcript
+            audio : torch.tensor(shape=(1, samples))
+                The speech signal to process
+            sample_rate : int
+                The audio sampling rate
+
+        Returns
+            alignment : pypar.Alignment
+                The forced alignment
+        """
+        # Preprocess
+        # Output shape: (1, 1, phonemes)
+        phonemes = self.g2p.from_texts([text])[0][1][None, None]
+        audio = pyfoal.resample(audio, sample_rate)
+
+        # Hold the model for the duration of this alignment
+        model = self.model
+
+        # Bound memory of long inputs by aligning in chunks of frames
+        frames = pyfoal.convert.samples_to_frames(audio.shape[-1])
+        if pyfoal.chunk_size(phonemes.shape[-1]) < frames:
+            return pyfoal.infer_chunked(
+                phonemes.to(self.device),
+                audio.to(self.device),
+                self.checkpoint,
+                model=model)
+
+        # Infer
+        logits, spectrogram = pyfoal.infer(
+            phonemes.to(self.device),
+            audio.to(self.device),
+            self.checkpoint,
+            return_spectrogram=True,
+            model=model)
+
+        # Postprocess
+        return pyfoal.postprocess(
+            phonemes[0],
+            logits[0],
+            audio[0],
+            spectrogram=spectrogram)
+
+    @property
+    def model(self):
+        """Retrieve the model, reloading it if it was evicted"""
+        return pyfoal.registry.get(self.checkpoint, self.device)
+
+    def submit(self, text, audio, sample_rate):
+        """Queue an alignment on the session threads
+
+        Returns
+            future : concurrent.futures.Future
+                The future pypar.Alignment
+        """
+        return self.executor.submit(
+            self.from_text_and_audio,
+            text,
+            audio,
+            sample_rate)
+
+
+###############################################################################
+# Default sessions
+###############################################################################
+
+
+def default(checkpoint=pyfoal.DEFAULT_CHECKPOINT, gpu=None):
+    """Retrieve the default session of a checkpoint and device
+
+    Default sessions are evicted along with the models in the registry.
+    """
+    return default.cache.get(
+        pyfoal.registry.cache_key(
+            checkpoint,
+            'cpu' if gpu is None else f'cuda:{gpu}'),
+        lambda: AlignerSession(checkpoint, gpu))
+
+
+default.cache = pyfoal.cache.LRU(
+    max_entries=pyfoal.MODEL_CACHE_ENTRIES,
+    size=lambda _: 0)
@@ -73,8 +73,8 @@ def train(
     #######################
 
     torch.manual_seed(pyfoal.RANDOM_SEED)
-    train_loader = pyfoal.data.loader(datasets, 'train', gpu)
-    valid_loader = pyfoal.data.loader(datasets, 'valid', gpu)
+    train_loader = pyfoal.data.loader(datasets, 'train', gpu, audio=False)
+    valid_loader = pyfoal.data.loader(datasets, 'valid', gpu, audio=False)
     test_loader = pyfoal.data.loader(pyfoal.EVALUATION_DATASETS, 'valid', gpu)
 
     #################
@@ -139,16 +139,26 @@ def train(
         for batch in train_loader:
 
             # Unpack batch
-            phonemes, audio, priors, mask, phoneme_lengths, frame_lengths, *_ = batch
+            (
+                phonemes,
+                audio,
+                mels,
+                priors,
+                mask,
+                phoneme_lengths,
+                frame_lengths,
+                *_
+            ) = batch
 
             with torch.autocast(device.type):
 
                 # Forward pass
                 logits = model(
                     phonemes.to(device),
-                    audio.to(device),
+                    to(audio, device),
                     priors.to(device),
-                    mask.to(device))
+                    mask.to(device),
+                    to(mels, device))
 
                 # Compute loss
                 losses = loss(
@@ -248,6 +258,7 @@ def evaluate(directory, step, model, gpu, condition, loader):
             (
                 phonemes,
                 audios,
+                mels,
                 priors,
                 mask,
                 phoneme_lengths,
@@ -260,20 +271,20 @@ def evaluate(directory, step, model, gpu, condition, loader):
             # Forward pass
             logits = model(
                 phonemes.to(device),
-                audios.to(device),
+                to(audios, device),
                 priors.to(device),
-                mask.to(device)).detach()
+                mask.to(device),
+                to(mels, device)).detach()
 
             if condition == 'test':
 
                 # Decode
-                alignments = [
-                    pyfoal.postprocess(
-                        phoneme[:, :phoneme_length],
-                        logit[:frame_length, :phoneme_length],
-                        audio[:, :pyfoal.convert.frames_to_samples(frame_length)])
-                    for phoneme, logit, audio, phoneme_length, frame_length in
-                    zip(phonemes, logits, audios, phoneme_lengths, frame_lengths)]
+                alignments = pyfoal.postprocess_batch(
+                    phonemes,
+                    logits,
+                    audios,
+                    phoneme_lengths,
+                    frame_lengths)
 
                 # Add audio and alignment plot
                 if i == 0:
@@ -411,3 +422,8 @@ def loss(logits, phoneme_lengths, frame_lengths):
 
     # Average
     return total / logits.shape[0]
+
+
+def to(tensor, device):
+    """Move an optional tensor to a device"""
+    return None if tensor is None else tensor.to(device)
@@ -1,3 +1,6 @@
+import math
+
+import pypar
 import torch
 
 import pyfoal
@@ -8,92 +11,542 @@ import pyfoal
 ###############################################################################
 
 
-def decode(phonemes, logits, loudness=None):
-    """Get phoneme indices and frame counts from network output"""
+def decode(
+    phonemes,
+    logits,
+    loudness=None,
+    method=pyfoal.DECODER,
+    return_confidence=False):
+    """Get phoneme indices and frame counts from network output
+
+    If return_confidence is True, also returns the mean forward-backward
+    posterior probability of each decoded phoneme over its frames
+    """
     # Normalize
-    observation = torch.nn.functional.log_softmax(logits, dim=0)
+    distribution = torch.nn.functional.log_softmax(logits, dim=0)
 
     # Viterbi decoding is faster on CPU
-    observation = observation.cpu()
+    distribution = distribution.cpu()
 
     # Always start at the first phoneme
     initial = torch.full(
-        (observation.shape[1],),
+        (distribution.shape[1],),
         -float('inf'),
-        dtype=observation.dtype)
+        dtype=distribution.dtype)
     initial[0] = 0.
 
     # Enforce monotonicity
-    transition = torch.zeros(
-        (observation.shape[1], observation.shape[1]),
-        dtype=observation.dtype)
-    transition.fill_diagonal_(1.)
-    transition[
-        torch.arange(len(transition) - 1) + 1,
-        torch.arange(len(transition) - 1)] = 1.
+    transition = transitions(phonemes[0], distribution.dtype)
 
-    # Allow spaces to optionally be skipped
-    if pyfoal.ALLOW_SKIP_SPACE:
+    # Maybe force skip silence if it's not actually silent
+    if pyfoal.ALLOW_SKIP_SPACE and not pyfoal.ALLOW_LOUD_SILENCE:
+        observation = distribution.masked_fill(
+            loud_silence(phonemes[0], loudness),
+            -float('inf'))
+    else:
+        observation = distribution
 
-        # Find spaces according to phonemes
-        space = phonemes[0] == pyfoal.convert.phoneme_to_index('<silent>')
+    # Frames between saved rows of the forward algorithm
+    interval = checkpoint_interval(observation.shape[0])
+    checkpoints = None
 
-        # Get indices
-        spaces = 1 + torch.where(space[1:-1])[0]
+    # Avoid storing lattices larger than the memory budget
+    if (
+        method == 'vectorized' and
+        observation.numel() > pyfoal.DECODER_MEMORY_BUDGET
+    ):
+        method = 'checkpointed'
 
-        # Uniform probability
-        transition[spaces + 1, spaces - 1] = 1.
+    # Band-limited Viterbi decoding
+    if method == 'banded':
+        indices = banded(observation, transition, initial)
 
-        # Maybe force skip silence if it's not actually silent
-        if not pyfoal.ALLOW_LOUD_SILENCE:
+    # Low-memory Viterbi decoding
+    elif method == 'checkpointed':
+        indices = checkpointed(observation, transition, initial)
 
-            # Save a copy
-            distribution = observation.clone()
+    # Reference Viterbi decoding
+    elif method == 'reference':
+
+        # Forward pass
+        posterior, memory = forward(observation, dense(transition), initial)
+
+        # Enforce alignment between final frame and final phoneme
+        posterior[-1] = -float('inf')
+        posterior[-1, -1] = 0.
+
+        # Backward pass
+        indices = backward(posterior, memory)
+
+    # Vectorized Viterbi decoding
+    elif method == 'vectorized':
+
+        # Forward pass. The forward algorithm for confidence scoring is run
+        # in the same sweep.
+        moves, _, checkpoints = forward_vectorized(
+            observation,
+            transition,
+            initial,
+            interval if return_confidence else None)
+
+        # Backward pass from the final phoneme
+        indices = traceback(moves, observation.shape[1] - 1)
 
-            # Mask loud silence
-            space[0], space[-1] = False, False
-            loud_indices = (
-                (loudness.squeeze() > pyfoal.SILENCE_THRESHOLD)[:, None] &
-                space[None])
-            observation[loud_indices] = -float('inf')
-        else:
-            distribution = observation
     else:
-        distribution = observation
+        raise ValueError(f'Decoder {method} is not defined')
+
+    # Get per-phoneme frame counts
+    if not return_confidence:
+        return durations(indices, distribution)
+
+    # Get forward-backward posterior of each frame along the decoded path
+    posterior = occupancy(
+        observation,
+        transition,
+        initial,
+        indices,
+        checkpoints,
+        interval)
+
+    return (
+        *durations(indices, distribution),
+        confidence(indices, posterior))
+
+
+def decode_chunked(
+    phonemes,
+    logits,
+    frames,
+    size,
+    loudness=None,
+    return_confidence=False):
+    """Get phoneme indices and frame counts from network output in chunks
+
+    Network output is computed on demand and decoded with checkpointing, so
+    memory is O((size + sqrt(frames)) x phonemes) instead of
+    O(frames x phonemes).
 
+    Arguments
+        phonemes : torch.tensor(shape=(1, phonemes))
+            The phoneme indices
+        logits : Callable[[int, int], torch.tensor]
+            Computes the network output for frames start through end
+        frames : int
+            The number of frames
+        size : int
+            The number of frames to compute at once
+        loudness : torch.tensor(shape=(1, frames)) or None
+            The per-frame loudness
+        return_confidence : bool
+            Whether to also return per-phoneme confidence
+
+    Returns
+        indices : torch.tensor
+            The decoded phoneme indices
+        counts : torch.tensor
+            The per-phoneme frame counts
+    """
     # Normalize
-    transition /= transition.sum(dim=1, keepdim=True)
-    transition = torch.log(transition)
+    distribution = Chunks(logits, (frames, phonemes.shape[-1]), size)
+
+    # Always start at the first phoneme
+    initial = torch.full(
+        (distribution.shape[1],),
+        -float('inf'),
+        dtype=distribution.dtype)
+    initial[0] = 0.
 
-    # Viterbi decoding forward pass
-    posterior, memory = forward(observation, transition, initial)
+    # Enforce monotonicity
+    transition = transitions(phonemes[0], distribution.dtype)
 
-    # Enforce alignment between final frame and final phoneme
-    posterior[-1] = -float('inf')
-    posterior[-1, -1] = 0.
+    # Maybe force skip silence if it's not actually silent
+    if pyfoal.ALLOW_SKIP_SPACE and not pyfoal.ALLOW_LOUD_SILENCE:
+        observation = Chunks(
+            logits,
+            distribution.shape,
+            size,
+            lambda start, end: loud_silence(
+                phonemes[0],
+                loudness[..., start:end]),
+            distribution.normalization)
+    else:
+        observation = distribution
 
-    # Backward pass
-    indices = backward(posterior, memory)
+    # Low-memory Viterbi decoding
+    indices = checkpointed(observation, transition, initial)
 
-    # Count consecutive indices
-    indices, counts = torch.unique_consecutive(indices, return_counts=True)
-    counts = counts.to(torch.float)
+    # Get per-phoneme frame counts
+    if not return_confidence:
+        return durations(indices, distribution)
 
-    # Maybe interpolate
-    if pyfoal.INTERPOLATE:
+    # Get forward-backward posterior of each frame along the decoded path
+    posterior = occupancy(observation, transition, initial, indices)
 
-        # Get interpolation value
-        frames = torch.cumsum(counts, dim=0)
-        weight = torch.softmax(
-            torch.stack((
-                distribution[frames[:-1].long(), indices[:-1].long()],
-                distribution[frames[:-1].long(), indices[:-1].long() + 1])),
-            dim=0)[0]
+    return (
+        *durations(indices, distribution),
+        confidence(indices, posterior))
 
-        # Apply to counts
-        counts[:-1] += weight
 
-    return indices, counts
+def decode_batch(
+    phonemes,
+    logits,
+    phoneme_lengths,
+    frame_lengths,
+    loudness=None):
+    """Get phoneme indices and frame counts from a padded batch
+
+    Arguments
+        phonemes : torch.tensor(shape=(batch, 1, phonemes))
+            The padded phoneme indices
+        logits : torch.tensor(shape=(batch, frames, phonemes))
+            The padded network output
+        phoneme_lengths : torch.tensor(shape=(batch,))
+            The number of phonemes of each item
+        frame_lengths : torch.tensor(shape=(batch,))
+            The number of frames of each item
+        loudness : torch.tensor(shape=(batch, frames)) or None
+            The padded per-frame loudness
+
+    Returns
+        indices : list[torch.tensor]
+            The phoneme indices of each item
+        counts : list[torch.tensor]
+            The per-phoneme frame counts of each item
+    """
+    batch, frames, states = logits.shape
+    phoneme_lengths = phoneme_lengths.cpu()
+    frame_lengths = frame_lengths.cpu()
+
+    # Mask padding
+    mask = (
+        (torch.arange(frames)[None, :, None] <
+         frame_lengths[:, None, None]) &
+        (torch.arange(states)[None, None] < phoneme_lengths[:, None, None]))
+
+    # Normalize. Phonemes that are entirely padding produce NaNs.
+    distribution = torch.nn.functional.log_softmax(
+        logits.cpu().masked_fill(~mask, -float('inf')),
+        dim=1).masked_fill(~mask, -float('inf'))
+
+    # Always start at the first phoneme
+    initial = torch.full((states,), -float('inf'), dtype=distribution.dtype)
+    initial[0] = 0.
+
+    # Enforce monotonicity for each item
+    stay, advance, skip = (
+        torch.full((batch, states), -float('inf'), dtype=distribution.dtype)
+        for _ in range(3))
+    for i, phoneme_length in enumerate(phoneme_lengths):
+        (
+            stay[i, :phoneme_length],
+            advance[i, :phoneme_length],
+            skip[i, :phoneme_length]
+        ) = transitions(
+            phonemes[i, 0, :phoneme_length].cpu(),
+            distribution.dtype)
+
+    # Maybe force skip silence if it's not actually silent
+    if pyfoal.ALLOW_SKIP_SPACE and not pyfoal.ALLOW_LOUD_SILENCE:
+        loud = torch.zeros_like(mask)
+        iterator = enumerate(zip(phoneme_lengths, frame_lengths))
+        for i, (phoneme_length, frame_length) in iterator:
+            loud[i, :frame_length, :phoneme_length] = loud_silence(
+                phonemes[i, 0, :phoneme_length].cpu(),
+                loudness[i, :frame_length].cpu())
+        observation = distribution.masked_fill(loud, -float('inf'))
+    else:
+        observation = distribution
+
+    # Initialize
+    posterior = observation[:, 0] + initial
+    moves = torch.zeros((batch, frames, states), dtype=torch.uint8)
+
+    # Forward pass over all items at once. Items stop updating after their
+    # final frame.
+    for t in range(1, frames):
+        current, moves[:, t] = step_vectorized(
+            posterior,
+            observation[:, t],
+            stay,
+            advance,
+            skip)
+        posterior = torch.where(
+            (t < frame_lengths)[:, None],
+            current,
+            posterior)
+
+    # Backward pass from the final frame and final phoneme of each item
+    indices = [
+        traceback(moves[i, :frame_length], phoneme_length.item() - 1)
+        for i, (phoneme_length, frame_length) in
+        enumerate(zip(phoneme_lengths, frame_lengths))]
+
+    # Get per-phoneme frame counts of each item
+    indices, counts = zip(*[
+        durations(index, item) for index, item in zip(indices, distribution)])
+    return list(indices), list(counts)
+
+
+###############################################################################
+# Chunked network output
+###############################################################################
+
+
+class Chunks:
+    """Frames x phonemes log-probabilities computed on demand
+
+    Supports the indexing used by the checkpointed decoder: single frames,
+    ranges of frames, and gathering (frames, phonemes) pairs. Each phoneme
+    is normalized over all frames, as in decode, which takes one pass over
+    the network output.
+
+    Arguments
+        logits : Callable[[int, int], torch.tensor]
+            Computes the network output for frames start through end
+        shape : tuple[int, int]
+            The number of frames and phonemes
+        size : int
+            The number of frames to compute at once
+        mask : Callable[[int, int], torch.tensor] or None
+            Computes a mask of entries to exclude for frames start through
+            end
+        normalization : torch.tensor(shape=(phonemes,)) or None
+            The log-normalization of each phoneme. Computed if not given.
+    """
+
+    def __init__(self, logits, shape, size, mask=None, normalization=None):
+        self.logits = logits
+        self.shape = torch.Size(shape)
+        self.size = size
+        self.mask = mask
+        self.dtype = torch.float
+
+        # Normalize each phoneme over all frames
+        if normalization is None:
+            normalization = torch.full(
+                (self.shape[1],),
+                -float('inf'),
+                dtype=self.dtype)
+            for start in range(0, self.shape[0], size):
+                end = min(start + size, self.shape[0])
+                normalization = torch.logaddexp(
+                    normalization,
+                    torch.logsumexp(
+                        logits(start, end).cpu().to(self.dtype),
+                        dim=0))
+        self.normalization = normalization
+
+    def __getitem__(self, index):
+        # Gather (frame, phoneme) pairs
+        if isinstance(index, tuple):
+            return self.gather(*index)
+
+        # Get one frame
+        if not isinstance(index, slice):
+            index = range(self.shape[0])[index]
+            return self[index:index + 1][0]
+
+        # Get a range of frames
+        start, stop, _ = index.indices(self.shape[0])
+        chunks = [
+            self.chunk(i, min(i + self.size, stop))
+            for i in range(start, stop, self.size)]
+        if not chunks:
+            return torch.zeros((0, self.shape[1]), dtype=self.dtype)
+        return torch.cat(chunks)
+
+    def chunk(self, start, end):
+        """Compute log-probabilities of frames start through end"""
+        chunk = self.logits(start, end).cpu().to(self.dtype)
+
+        # Normalize
+        chunk = chunk - self.normalization
+
+        # Maybe mask
+        if self.mask is not None:
+            chunk = chunk.masked_fill(self.mask(start, end), -float('inf'))
+
+        return chunk
+
+    def gather(self, frames, indices):
+        """Get log-probabilities of (frame, phoneme) pairs"""
+        values = torch.zeros(len(frames), dtype=self.dtype)
+        for start in range(0, self.shape[0], self.size):
+            end = min(start + self.size, self.shape[0])
+
+            # Only compute chunks containing requested frames
+            selected = (frames >= start) & (frames < end)
+            if selected.any():
+                values[selected] = self.chunk(start, end)[
+                    frames[selected] - start,
+                    indices[selected]]
+
+        return values
+
+
+###############################################################################
+# Online Viterbi decoding
+###############################################################################
+
+
+class Online:
+    """Incremental Viterbi decoder for streaming alignment
+
+    Blocks of logits are decoded as they arrive. States whose posterior is
+    more than pyfoal.ONLINE_BEAM below the best state are pruned. After each
+    block, the backpointers of all surviving states are followed until they
+    converge on a single state. Frames up to that point can no longer change, so
+    phonemes that end before it are emitted and their backpointers are
+    discarded. Memory is proportional to the undecided window.
+
+    Unlike decode, which normalizes each phoneme over all frames, each frame
+    is normalized over phonemes so that earlier frames do not depend on
+    later ones. Interpolation is not applied.
+
+    Arguments
+        phonemes : torch.tensor(shape=(1, phonemes))
+            The phoneme indices of the transcript
+    """
+
+    def __init__(self, phonemes):
+        self.phonemes = phonemes[0].cpu()
+        self.transition = transitions(self.phonemes)
+        self.posterior = None
+
+        # Moves into each state for frames that are not yet fixed
+        self.moves = []
+
+        # Index of first frame in self.moves
+        self.start = 0
+
+        # Total number of frames and number of frames that have been emitted
+        self.frames = 0
+        self.fixed = 0
+
+        # Phoneme index and start frame of the phoneme being decoded
+        self.state = None
+        self.onset = 0
+
+    def update(self, logits, loudness=None):
+        """Decode a block of frames
+
+        Arguments
+            logits : torch.tensor(shape=(frames, phonemes))
+                The network output for the block
+            loudness : torch.tensor(shape=(1, frames)) or None
+                The per-frame loudness of the block
+
+        Returns
+            phonemes : list[pypar.Phoneme]
+                The phonemes whose start and end times became fixed
+        """
+        # Normalize
+        observation = torch.nn.functional.log_softmax(logits, dim=1).cpu()
+
+        # Maybe force skip silence if it's not actually silent
+        if pyfoal.ALLOW_SKIP_SPACE and not pyfoal.ALLOW_LOUD_SILENCE:
+            observation = observation.masked_fill(
+                loud_silence(self.phonemes, loudness.cpu()),
+                -float('inf'))
+
+        # Forward pass
+        stay, advance, skip = self.transition
+        for row in observation:
+
+            # Always start at the first phoneme
+            if self.posterior is None:
+                initial = torch.full_like(row, -float('inf'))
+                initial[0] = 0.
+                self.posterior = row + initial
+                moves = torch.zeros(len(row), dtype=torch.uint8)
+
+            else:
+                self.posterior, moves = step_vectorized(
+                    self.posterior,
+                    row,
+                    stay,
+                    advance,
+                    skip)
+
+            # Prune states outside the beam
+            self.posterior.masked_fill_(
+                self.posterior < self.posterior.max() - pyfoal.ONLINE_BEAM,
+                -float('inf'))
+
+            self.moves.append(moves)
+            self.frames += 1
+
+        # Find the latest frame where all surviving paths agree
+        alive = torch.where(self.posterior > -float('inf'))[0]
+        for i in range(len(self.moves) - 1, 0, -1):
+            alive = torch.unique(alive - self.moves[i][alive])
+            if len(alive) == 1:
+                break
+        else:
+            return []
+
+        # Backward pass over fixed frames
+        path = traceback(torch.stack(self.moves[:i]), alive.item())
+        alignment = self.emit(path)
+
+        # Discard backpointers of fixed frames
+        self.moves = self.moves[i - 1:]
+        self.start += i - 1
+
+        return alignment
+
+    def finish(self):
+        """Decode the remaining frames, ending on the final phoneme
+
+        Returns
+            phonemes : list[pypar.Phoneme]
+                The remaining phonemes
+        """
+        # End on the final phoneme unless it was pruned
+        state = len(self.phonemes) - 1
+        if self.posterior[state] == -float('inf'):
+            state = torch.argmax(self.posterior).item()
+
+        # Backward pass
+        path = traceback(torch.stack(self.moves), state)
+        alignment = self.emit(path)
+
+        # The last decoded phoneme ends on the final frame
+        alignment.append(self.phoneme(self.state, self.onset, self.frames))
+
+        # Any pruned phonemes after it have zero duration
+        for state in range(self.state + 1, len(self.phonemes)):
+            alignment.append(self.phoneme(state, self.frames, self.frames))
+
+        return alignment
+
+    def emit(self, path):
+        """Get phonemes that end within a path starting at self.start"""
+        alignment = []
+        for frame, state in enumerate(path.tolist(), self.start):
+
+            # Skip frames that have already been emitted
+            if frame < self.fixed:
+                continue
+
+            # Start of the first phoneme
+            if self.state is None:
+                self.state = state
+
+            # Start of a new phoneme
+            elif state != self.state:
+                alignment.append(self.phoneme(self.state, self.onset, frame))
+                self.state, self.onset = state, frame
+
+        self.fixed = self.start + len(path)
+        return alignment
+
+    def phoneme(self, state, start, end):
+        """Create a phoneme from its index and start and end frames"""
+        return pypar.Phoneme(
+            pyfoal.convert.index_to_phoneme(self.phonemes[state].item()),
+            pyfoal.convert.frames_to_seconds(start),
+            pyfoal.convert.frames_to_seconds(end))
 
 
 ###############################################################################
@@ -117,6 +570,169 @@ def backward(posterior, memory):
     return indices
 
 
+def band(frames, states, width):
+    """Get the first state of the band at each frame
+
+    The band is centered on the mean of the beta-binomial attention prior,
+    which follows the diagonal of the frames x phonemes lattice.
+    """
+    # Center on the prior
+    center = torch.round(
+        (states - 1) *
+        torch.arange(1, frames + 1, dtype=torch.float) /
+        (frames + 1)).to(torch.long)
+    offsets = torch.clamp(center - width // 2, 0, states - width)
+
+    # Always start at the first phoneme and end at the last phoneme
+    offsets[0], offsets[-1] = 0, states - width
+
+    return offsets
+
+
+def banded(observation, transition, initial, width=pyfoal.BAND_WIDTH):
+    """Band-limited Viterbi decoding
+
+    Only states within a window around the diagonal are tracked, so time
+    and memory are proportional to frames x width. The band is doubled until
+    the best path does not touch its edges.
+    """
+    states = observation.shape[1]
+    while True:
+        width = min(width, states)
+
+        # Forward pass
+        offsets, moves, posterior = forward_banded(
+            observation,
+            transition,
+            initial,
+            width)
+
+        # Backward pass from the final phoneme
+        if width == states or posterior[-1] > -float('inf'):
+            indices = traceback(moves, states - 1, offsets)
+
+            # Band covers all states
+            if width == states:
+                return indices
+
+            # Check if the best path reaches the edge of the band
+            position = indices - offsets
+            edge = (
+                ((position == 0) & (offsets > 0)) |
+                ((position == width - 1) & (offsets + width < states)))
+            if not edge.any():
+                return indices
+
+        # Widen
+        width *= 2
+
+
+def checkpoint_interval(frames):
+    """Get the number of frames between checkpoints that minimizes memory"""
+    return max(1, math.ceil(2 * math.sqrt(frames)))
+
+
+def checkpointed(observation, transition, initial, interval=None):
+    """Viterbi decoding that stores only periodic rows of the forward pass
+
+    The posterior is saved every interval frames. During the backward pass,
+    the moves of each segment are recomputed from its checkpoint. The
+    default interval of 2 sqrt(frames) minimizes memory, which is then
+    O(sqrt(frames) x phonemes), for the cost of one extra forward pass.
+    """
+    frames, states = observation.shape
+    if interval is None:
+        interval = checkpoint_interval(frames)
+
+    stay, advance, skip = transition
+
+    # Add prior to first frame
+    posterior = observation[0] + initial
+
+    # Forward pass saving the posterior at the start of each segment
+    starts, checkpoints = range(0, frames, interval), []
+    for start in starts:
+        checkpoints.append(posterior)
+        for row in observation[start + 1:start + interval + 1]:
+            posterior, _ = step_vectorized(
+                posterior,
+                row,
+                stay,
+                advance,
+                skip)
+
+    # Backward pass from the final phoneme, one segment at a time
+    state = states - 1
+    indices = torch.zeros(frames, dtype=torch.int)
+    for start, posterior in zip(reversed(starts), reversed(checkpoints)):
+
+        # Recompute moves up to the first frame of the next segment, whose
+        # state is already known
+        end = min(start + interval, frames - 1)
+        moves = torch.zeros((end - start + 1, states), dtype=torch.uint8)
+        for i, row in enumerate(observation[start + 1:end + 1], 1):
+            posterior, moves[i] = step_vectorized(
+                posterior,
+                row,
+                stay,
+                advance,
+                skip)
+
+        # Backward pass within segment
+        indices[start:end + 1] = traceback(moves, state)
+        state = indices[start].item()
+
+    return indices
+
+
+def confidence(indices, posterior):
+    """Get the mean posterior of each phoneme over its consecutive frames"""
+    _, counts = torch.unique_consecutive(indices, return_counts=True)
+    segments = torch.repeat_interleave(torch.arange(len(counts)), counts)
+    total = torch.zeros(len(counts), dtype=posterior.dtype).index_add_(
+        0,
+        segments,
+        torch.exp(posterior))
+    return total / counts
+
+
+def dense(transition):
+    """Convert transitions to a dense (phonemes, phonemes) matrix"""
+    stay, advance, skip = transition
+    indices = torch.arange(len(stay))
+    matrix = torch.full(
+        (len(stay), len(stay)),
+        -float('inf'),
+        dtype=stay.dtype)
+    matrix[indices, indices] = stay
+    matrix[indices[1:], indices[:-1]] = advance[1:]
+    matrix[indices[2:], indices[:-2]] = skip[2:]
+    return matrix
+
+
+def durations(indices, distribution):
+    """Get per-phoneme frame counts from frame-wise phoneme indices"""
+    # Count consecutive indices
+    indices, counts = torch.unique_consecutive(indices, return_counts=True)
+    counts = counts.to(torch.float)
+
+    # Maybe interpolate
+    if pyfoal.INTERPOLATE:
+
+        # Get interpolation value
+        frames = torch.cumsum(counts, dim=0)
+        weight = torch.softmax(
+            torch.stack((
+                distribution[frames[:-1].long(), indices[:-1].long()],
+                distribution[frames[:-1].long(), indices[:-1].long() + 1])),
+            dim=0)[0]
+
+        # Apply to counts
+        counts[:-1] += weight
+
+    return indices, counts
+
+
 def forward(observation, transition, initial):
     """Viterbi decoding forward pass"""
     # Initialize
@@ -136,6 +752,184 @@ def forward(observation, transition, initial):
     return posterior, memory
 
 
+def forward_banded(observation, transition, initial, width):
+    """Viterbi decoding forward pass over a band of states
+
+    Returns the first state of the band at each frame, the moves into each
+    state of the band, and the posterior of the band at the final frame
+    """
+    frames, states = observation.shape
+    offsets = band(frames, states, width)
+
+    # Pad transitions so that each frame can see two states before its band
+    stay, advance, skip = (
+        torch.nn.functional.pad(probability, (2, 0), value=-float('inf'))
+        for probability in transition)
+
+    # Initialize
+    moves = torch.zeros((frames, width), dtype=torch.uint8)
+
+    # Add prior to first frame
+    posterior = observation[0, :width] + initial[:width]
+
+    # Forward pass
+    starts = offsets.tolist()
+    for t in range(1, frames):
+        offset = starts[t]
+
+        # Previous posterior over this band and the two states before it
+        previous = window(posterior, offset - starts[t - 1] - 2, width + 2)
+
+        # Update
+        current, move = step_vectorized(
+            previous,
+            torch.nn.functional.pad(
+                observation[t, offset:offset + width],
+                (2, 0),
+                value=-float('inf')),
+            stay[offset:offset + width + 2],
+            advance[offset:offset + width + 2],
+            skip[offset:offset + width + 2])
+        posterior, moves[t] = current[2:], move[2:]
+
+    return offsets, moves, posterior
+
+
+def forward_vectorized(observation, transition, initial, interval=None):
+    """Viterbi decoding forward pass over all states at once
+
+    Returns the moves into each state at each frame and the posterior at the
+    final frame. If interval is given, the forward algorithm is run in the
+    same sweep and its log-probabilities are saved every interval frames.
+    """
+    stay, advance, skip = transition
+
+    # Initialize
+    moves = torch.zeros(observation.shape, dtype=torch.uint8)
+
+    # Add prior to first frame
+    posterior = observation[0] + initial
+    total, checkpoints = posterior, [posterior]
+
+    # Forward pass
+    for t in range(1, observation.shape[0]):
+        posterior, moves[t] = step_vectorized(
+            posterior,
+            observation[t],
+            stay,
+            advance,
+            skip)
+
+        # Maybe run the forward algorithm
+        if interval is not None:
+            total = step_total(total, observation[t], stay, advance, skip)
+            if t % interval == 0:
+                checkpoints.append(total)
+
+    return moves, posterior, checkpoints if interval is not None else None
+
+
+def loud_silence(phonemes, loudness):
+    """Get a mask of loud frames on interior silent tokens"""
+    # Find spaces according to phonemes
+    space = phonemes == pyfoal.convert.phoneme_to_index('<silent>')
+
+    # Silence is always allowed at the boundaries
+    space[0], space[-1] = False, False
+
+    # Mask loud silence
+    return (
+        (loudness.reshape(-1) > pyfoal.SILENCE_THRESHOLD)[:, None] &
+        space[None])
+
+
+def occupancy(
+    observation,
+    transition,
+    initial,
+    indices,
+    checkpoints=None,
+    interval=None):
+    """Get the forward-backward log-posterior of each frame along a path
+
+    The forward algorithm is saved every interval frames and recomputed one
+    segment at a time during the backward algorithm, so memory is
+    O(interval x phonemes) rather than O(frames x phonemes). If checkpoints
+    are not given, they are computed with an additional forward sweep.
+    """
+    frames, states = observation.shape
+    if interval is None:
+        interval = checkpoint_interval(frames)
+    stay, advance, skip = transition
+    starts = range(0, frames, interval)
+
+    # Maybe run the forward algorithm. Each segment is read with one slice,
+    # so chunked observations are computed once per segment.
+    if checkpoints is None:
+        total = observation[0] + initial
+        checkpoints = []
+        for start in starts:
+            checkpoints.append(total)
+            for row in observation[start + 1:start + interval + 1]:
+                total = step_total(total, row, stay, advance, skip)
+
+    # Enforce alignment between final frame and final phoneme
+    following = torch.full(
+        (states,),
+        -float('inf'),
+        dtype=observation.dtype)
+    following[-1] = 0.
+
+    # Backward algorithm, one segment at a time
+    path = indices.tolist()
+    posterior = torch.zeros(frames, dtype=observation.dtype)
+    normalization = None
+    for start, total in zip(reversed(starts), reversed(checkpoints)):
+        end = min(start + interval, frames)
+
+        # Observations of frames start + 1 through end
+        rows = observation[start + 1:end + 1]
+
+        # Recompute forward algorithm over segment
+        totals = [total]
+        for row in rows[:end - start - 1]:
+            totals.append(step_total(totals[-1], row, stay, advance, skip))
+
+        # Total probability of all paths ending on the final phoneme
+        if normalization is None:
+            normalization = totals[-1][-1]
+
+        # Combine forward and backward log-probabilities along path
+        for t in range(end - 1, start - 1, -1):
+            if t < frames - 1:
+                following = step_backward(
+                    following,
+                    rows[t - start],
+                    stay,
+                    advance,
+                    skip)
+            posterior[t] = totals[t - start][path[t]] + following[path[t]]
+
+    return posterior - normalization
+
+
+def shift(posterior, offset):
+    """Shift posterior along the state dimension, filling with -inf
+
+    Positive offsets move values to later states and negative offsets move
+    values to earlier states.
+    """
+    if offset < 0:
+        return torch.nn.functional.pad(
+            posterior,
+            (0, -offset),
+            value=-float('inf'))[..., -offset:]
+    return torch.nn.functional.pad(
+        posterior,
+        (offset, 0),
+        value=-float('inf'))[..., :posterior.shape[-1]]
+
+
 def step(index, observation, transition, posterior, memory):
     """One step of the forward pass"""
     probability = posterior[index - 1] + transition
@@ -145,3 +939,112 @@ def step(index, observation, transition, posterior, memory):
         memory[index, j] = torch.argmax(probability[j])
         posterior[index, j] = \
             observation[index, j] + probability[j, memory[index][j]]
+
+
+def step_backward(following, observation, stay, advance, skip):
+    """One step of the backward algorithm over all states at once"""
+    following = following + observation
+    return torch.logsumexp(
+        torch.stack((
+            following + stay,
+            shift(following + advance, -1),
+            shift(following + skip, -2))),
+        dim=0)
+
+
+def step_total(previous, observation, stay, advance, skip):
+    """One step of the forward algorithm over all states at once"""
+    return observation + torch.logsumexp(
+        torch.stack((
+            previous + stay,
+            shift(previous, 1) + advance,
+            shift(previous, 2) + skip)),
+        dim=0)
+
+
+def step_vectorized(previous, observation, stay, advance, skip):
+    """One step of the forward pass over all states at once
+
+    Returns the posterior of the current frame and, for each state, the
+    number of states moved since the previous frame (0, 1, or 2)
+    """
+    # Score staying in place
+    best = previous + stay
+    moves = torch.zeros(best.shape, dtype=torch.uint8, device=best.device)
+
+    # Score advancing one phoneme and skipping a space. Ties are broken in
+    # favor of the lowest source state to match the reference argmax.
+    for move, transition in ((1, advance), (2, skip)):
+        probability = shift(previous, move) + transition
+        update = (probability >= best) & (probability > -float('inf'))
+        best = torch.where(update, probability, best)
+        moves.masked_fill_(update, move)
+
+    return observation + best, moves
+
+
+def traceback(moves, state, offsets=None):
+    """Get optimal path by following moves backward from the final state
+
+    Moves are read as Python integers from a flat view of the lattice, which
+    avoids indexing a tensor at every frame.
+    """
+    frames, width = moves.shape
+    lattice = memoryview(moves.contiguous().numpy().reshape(-1))
+    starts = [0] * frames if offsets is None else offsets.tolist()
+
+    # Backward
+    indices = [state] * frames
+    for t in range(frames - 1, 0, -1):
+        state -= lattice[t * width + state - starts[t]]
+        indices[t - 1] = state
+
+    return torch.tensor(indices, dtype=torch.int)
+
+
+def transitions(phonemes, dtype=torch.float):
+    """Get monotonic log transition probabilities into each phoneme
+
+    Only three transitions are allowed: staying on a phoneme, advancing one
+    phoneme, and skipping over a space. Returns the log-probability of each
+    as a 1D tensor over destination phonemes, with -inf where a transition
+    is not allowed. Each phoneme has uniform probability over its allowed
+    source phonemes.
+    """
+    states = torch.arange(len(phonemes))
+
+    # Every phoneme but the first can be reached from the previous phoneme
+    advance = states > 0
+
+    # Allow spaces to optionally be skipped
+    skip = torch.zeros(len(phonemes), dtype=torch.bool)
+    if pyfoal.ALLOW_SKIP_SPACE:
+
+        # Find spaces according to phonemes
+        space = phonemes == pyfoal.convert.phoneme_to_index('<silent>')
+
+        # Get indices
+        spaces = 1 + torch.where(space[1:-1])[0]
+
+        # Allow the phoneme after each space to be reached from before it
+        skip[spaces + 1] = True
+
+    # Uniform probability
+    probability = torch.log(
+        torch.ones(len(phonemes), dtype=dtype) /
+        (1 + advance.to(dtype) + skip.to(dtype)))
+
+    return (
+        probability,
+        probability.masked_fill(~advance, -float('inf')),
+        probability.masked_fill(~skip, -float('inf')))
+
+
+def window(posterior, start, size):
+    """Get posterior[start:start + size], filling out-of-range states with -inf"""
+    padded = torch.nn.functional.pad(
+        posterior,
+        (max(-start, 0), max(start + size - len(posterior), 0)),
+        value=-float('inf'))
+    start = max(start, 0)
+    return padded[start:start + size]
@@ -0,0 +1,49 @@
+import torch
+
+import pyfoal
+
+
+###############################################################################
+# Test model
+###############################################################################
+
+
+def test_attend_ignores_padded_phonemes():
+    """Padded phonemes do not change the attention of a batch item"""
+    torch.manual_seed(0)
+    model = pyfoal.Model().eval()
+    frames, phonemes, padded = 30, 12, 20
+
+    # Encoded inputs and prior of one item
+    query = torch.randn((1, pyfoal.ATTENTION_WIDTH, frames))
+    key = torch.randn((1, pyfoal.ATTENTION_WIDTH, phonemes))
+    prior = pyfoal.data.preprocess.prior.from_lengths_cached(
+        phonemes,
+        frames,
+        torch.device('cpu'))[None]
+
+    # Pad phonemes as in a batch with a longer transcript
+    padded_key = torch.cat(
+        (key, torch.randn((1, pyfoal.ATTENTION_WIDTH, padded - phonemes))),
+        dim=2)
+    padded_prior = torch.nn.functional.pad(prior, (0, padded - phonemes))
+    mask = torch.zeros((1, frames, padded), dtype=torch.bool)
+    mask[..., :phonemes] = True
+
+    with torch.no_grad():
+        expected = model.attend(query, key, prior)
+        actual = model.attend(query, padded_key, padded_prior, mask)
+
+    assert torch.allclose(actual[..., :phonemes], expected, atol=1e-5)
+
+
+def test_distance_matches_direct():
+    """Expanded distance matches the direct squared difference"""
+    torch.manual_seed(0)
+    query = torch.randn((2, pyfoal.ATTENTION_WIDTH, 50))
+    key = torch.randn((2, pyfoal.ATTENTION_WIDTH, 20))
+
+    expected = ((query[..., None] - key[:, :, None]) ** 2).sum(1)
+    actual = pyfoal.model.distance(query, key)
+
+    assert torch.allclose(actual, expected, rtol=1e-5, atol=1e-5)
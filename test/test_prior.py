@@ -0,0 +1,41 @@
+import pytest
+import torch
+
+import pyfoal
+
+
+###############################################################################
+# Test attention prior
+###############################################################################
+
+
+@pytest.mark.parametrize('phonemes,frames', [(1, 10), (30, 200), (57, 431)])
+def test_from_lengths_matches_scipy(phonemes, frames):
+    """Prior matches the scipy beta-binomial distribution"""
+    np = pytest.importorskip('numpy')
+    stats = pytest.importorskip('scipy.stats')
+
+    # Reference
+    indices = np.arange(phonemes)
+    expected = torch.tensor(np.array([
+        stats.betabinom(
+            phonemes - 1,
+            pyfoal.ATTENTION_PRIOR_SCALE_FACTOR * i,
+            pyfoal.ATTENTION_PRIOR_SCALE_FACTOR * (frames - i + 1)
+        ).pmf(indices)
+        for i in range(1, frames + 1)]))
+
+    # Full prior and a chunk of frames
+    actual = pyfoal.data.preprocess.prior.from_lengths(phonemes, frames)
+    chunk = pyfoal.data.preprocess.prior.from_lengths(
+        phonemes,
+        frames,
+        frames // 3,
+        frames // 2)
+
+    assert torch.allclose(actual, expected, rtol=0., atol=1e-10)
+    assert torch.allclose(
+        chunk,
+        expected[frames // 3:frames // 2],
+        rtol=0.,
+        atol=1e-10)
@@ -0,0 +1,143 @@
+import pytest
+import torch
+
+import pyfoal
+
+
+###############################################################################
+# Test online Viterbi decoding
+###############################################################################
+
+
+def test_online_emits_before_finish():
+    """Online decoding emits fixed phonemes before the input ends"""
+    # Transcript without spaces
+    indices = [
+        i for i, phoneme in enumerate(pyfoal.load.phonemes())
+        if not phoneme.startswith('<')]
+    phonemes = torch.tensor(indices)[None]
+    count = len(indices)
+
+    # Ten frames per phoneme with perfectly peaked logits
+    targets = torch.arange(count).repeat_interleave(10)
+    logits = torch.full((10 * count, count), -100.)
+    logits[torch.arange(10 * count), targets] = 100.
+
+    # Decode in blocks of 20 frames
+    decoder = pyfoal.viterbi.Online(phonemes)
+    alignment = []
+    for block in logits.split(20):
+        alignment.extend(decoder.update(block))
+    early = len(alignment)
+    alignment.extend(decoder.finish())
+
+    # Phonemes are emitted early and backpointers stay bounded
+    assert early >= count - 2
+    assert len(decoder.moves) <= 40
+
+    # The alignment matches the logits
+    assert len(alignment) == count
+    for i, phoneme in enumerate(alignment):
+        assert phoneme.start() == pyfoal.convert.frames_to_seconds(10 * i)
+        assert phoneme.end() == pyfoal.convert.frames_to_seconds(10 * i + 10)
+
+
+###############################################################################
+# Test Viterbi decoding
+###############################################################################
+
+
+@pytest.mark.parametrize('skip', [False, True])
+@pytest.mark.parametrize('loud', [False, True])
+def test_decoders_match_reference(monkeypatch, skip, loud):
+    """All decoders find the same path as the reference decoder"""
+    monkeypatch.setattr(pyfoal, 'ALLOW_SKIP_SPACE', skip)
+    monkeypatch.setattr(pyfoal, 'ALLOW_LOUD_SILENCE', not loud)
+
+    # Use a band narrower than the transcripts
+    monkeypatch.setattr(pyfoal.viterbi.banded, '__defaults__', (4,))
+
+    torch.manual_seed(0)
+
+    # Transcripts with interior spaces
+    silent = pyfoal.convert.phoneme_to_index('<silent>')
+    sentences = [
+        torch.tensor([silent, 5, 6, silent, 7, 8, 9, silent, 10, silent]),
+        torch.tensor([silent, 11, 12, silent, 13, silent])]
+    lengths = [120, 70]
+
+    # Random network output and loudness
+    logits = [
+        torch.randn((frames, len(phonemes)))
+        for phonemes, frames in zip(sentences, lengths)]
+    loudness = [
+        pyfoal.SILENCE_THRESHOLD + 10. * torch.randn((1, frames))
+        for frames in lengths]
+
+    # Decode each item with every method
+    expected = []
+    for phonemes, logit, level in zip(sentences, logits, loudness):
+        phonemes = phonemes[None]
+        indices, counts = pyfoal.viterbi.decode(
+            phonemes,
+            logit,
+            level,
+            method='reference')
+        expected.append((indices, counts))
+        for method in ['banded', 'checkpointed', 'vectorized']:
+            actual = pyfoal.viterbi.decode(phonemes, logit, level, method)
+            assert torch.equal(actual[0], indices)
+            assert torch.equal(actual[1], counts)
+
+    # Decode as a padded batch
+    states, frames = max(map(len, sentences)), max(lengths)
+    phonemes = torch.zeros((2, 1, states), dtype=torch.long)
+    padded = torch.zeros((2, frames, states))
+    levels = torch.zeros((2, frames))
+    for i, (sentence, logit, level) in enumerate(
+        zip(sentences, logits, loudness)
+    ):
+        phonemes[i, 0, :len(sentence)] = sentence
+        padded[i, :logit.shape[0], :logit.shape[1]] = logit
+        levels[i, :logit.shape[0]] = level[0]
+    indices, counts = pyfoal.viterbi.decode_batch(
+        phonemes,
+        padded,
+        torch.tensor(list(map(len, sentences))),
+        torch.tensor(lengths),
+        levels)
+    for i, (index, count) in enumerate(expected):
+        assert torch.equal(indices[i], index)
+        assert torch.equal(counts[i], count)
+
+
+def test_decode_chunked_confidence():
+    """Chunked decoding matches decoding with few network evaluations"""
+    torch.manual_seed(0)
+    silent = pyfoal.convert.phoneme_to_index('<silent>')
+    phonemes = torch.tensor([[silent, 5, 6, silent, 7, 8, 9, silent]])
+    logits = torch.randn((300, phonemes.shape[-1]))
+
+    # Count network evaluations
+    calls = []
+
+    def chunk(start, end):
+        calls.append((start, end))
+        return logits[start:end]
+
+    expected = pyfoal.viterbi.decode(
+        phonemes,
+        logits,
+        method='vectorized',
+        return_confidence=True)
+    actual = pyfoal.viterbi.decode_chunked(
+        phonemes,
+        chunk,
+        logits.shape[0],
+        16,
+        return_confidence=True)
+
+    assert torch.equal(actual[0], expected[0])
+    assert torch.equal(actual[1], expected[1])
+    assert torch.allclose(actual[2], expected[2], atol=1e-3)
+    assert len(calls) < logits.shape[0]